@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model import StarModel
+
+# Default star of run_calculation
+rho_s = 1665.3
+mn = 939.565
+flag = 1
+
+def separate_rk4_step(model, r, m, p, h, rho_s, mn, flag):
+
+    '''
+    RK4 step as it was written before the fused kernel:
+    dm_dr and dp_dr evaluate the EOS separately on every stage
+    '''
+
+    y = np.zeros(2)
+    k11 = model.dm_dr(r, m, p, rho_s, mn)
+    k21 = model.dp_dr(r, m, p, rho_s, mn, flag)
+    k12 = model.dm_dr(r + 0.5*h, m + 0.5*k11*h, p + 0.5*k21*h, rho_s, mn)
+    k22 = model.dp_dr(r + 0.5*h, m + 0.5*k11*h, p + 0.5*k21*h, rho_s, mn, flag)
+    k13 = model.dm_dr(r + 0.5*h, m + 0.5*k12*h, p + 0.5*k22*h, rho_s, mn)
+    k23 = model.dp_dr(r + 0.5*h, m + 0.5*k12*h, p + 0.5*k22*h, rho_s, mn, flag)
+    k14 = model.dm_dr(r + h, m + k13*h, p + k23*h, rho_s, mn)
+    k24 = model.dp_dr(r + h, m + k13*h, p + k23*h, rho_s, mn, flag)
+    y[0] = m + h*(k11 + 2*k12 + 2*k13 + k14)/6
+    y[1] = p + h*(k21 + 2*k22 + 2*k23 + k24)/6
+    return y
+
+def integrate(step, model, N=1501, r_max=15, tol=9e-5):
+
+    '''
+    The run_calculation loop with a pluggable step function
+    Returns the number of steps taken and the final (m, p)
+    '''
+
+    r = np.linspace(0, r_max, N)
+    h = r[1]-r[0]
+    m = 0.
+    p = 363.44 * (model.initial_n(rho_s, mn)**2.54)/rho_s
+    for i in range(0, N-1):
+        m, p = step(model, r[i], m, p, h, rho_s, mn, flag)
+        if p < tol:
+            break
+    return i + 1, m, p
+
+def bench_rhs(repeat=5):
+
+    '''
+    Per-step time of the separate and the fused right hand side
+    The best of `repeat` full integrations is used for each variant
+    '''
+
+    model = StarModel()
+    variants = {"separate": separate_rk4_step, "fused": StarModel.RK4Solver}
+    results = {}
+    for name, step in variants.items():
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            steps, m, p = integrate(step, model)
+            best = min(best, time.perf_counter() - start)
+        results[name] = {"steps": steps, "us_per_step": best/steps*1e6, "m": m, "p": p}
+
+    '''Fused and separate kernels have to agree up to rounding'''
+    sep, fus = results["separate"], results["fused"]
+    assert sep["steps"] == fus["steps"], "surface reached on a different step"
+    assert np.isclose(sep["m"], fus["m"], rtol=1e-12, atol=0), (sep["m"], fus["m"])
+    assert np.isclose(sep["p"], fus["p"], rtol=1e-9, atol=1e-15), (sep["p"], fus["p"])
+    return results
+
+def bench_backends(stars=200):
+
+    '''
+    Stars per second of integrate_rk4 (the run_calculation loop) for every backend
+    Both backends are checked against each other on the same set of stars
+    '''
+
+    rho_grid = np.linspace(500, 5000, stars)
+    results = {}
+    for backend in ("numpy", "numba"):
+        model = StarModel(backend=backend)
+        if model.backend != backend:
+            continue
+        # Warm up, so compilation isn't counted
+        model.integrate_rk4(rho_s, mn, flag)
+        start = time.perf_counter()
+        out = [model.integrate_rk4(rho, mn, flag) for rho in rho_grid]
+        elapsed = time.perf_counter() - start
+        results[backend] = {"stars_per_s": stars/elapsed,
+                            "m": np.array([o[1][-1] for o in out]),
+                            "r": np.array([o[0][-1] for o in out])}
+
+    if "numba" in results:
+        ref, jit = results["numpy"], results["numba"]
+        assert np.array_equal(ref["r"], jit["r"]), "backends stopped on different steps"
+        assert np.allclose(ref["m"], jit["m"], rtol=1e-12, atol=0, equal_nan=True), "backends disagree on the mass"
+    return results
+
+if __name__ == "__main__":
+    results = bench_rhs()
+    for name, res in results.items():
+        print(f"{name:>9}: {res['us_per_step']:8.2f} us/step over {res['steps']} steps, M = {res['m']:.15g}")
+    print(f"  speedup: {results['separate']['us_per_step']/results['fused']['us_per_step']:.2f}x")
+
+    results = bench_backends()
+    for name, res in results.items():
+        print(f"{name:>9}: {res['stars_per_s']:10.1f} stars/s")
+    if "numba" not in results:
+        print("    numba: not installed")
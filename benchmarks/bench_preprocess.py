@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.preprocess_data import Preprocess
+
+# Star of draw.py
+amp = 100
+beta = 4.5
+radius = 6
+
+def bench_radial(resolution=1600, frames=40, sample=8):
+
+    '''
+    Per-frame time of the direct and the radial render path
+    Every sample-th frame of the pulsing and the exploding sequence is rendered
+    both ways, the color level difference and the radius table error are
+    reported next to RadialProfile.error_bound (tests/test_radial.py checks them).
+    '''
+
+    preprocess = Preprocess()
+    x = np.linspace(-20, 20, resolution)
+    X, Y = np.meshgrid(x, x)
+    scenarios = {
+        "pulse": (preprocess.pulse_params(frames, 0, 0, radius, 0.1), "normal"),
+        "exploding": (preprocess.explosion_params(frames, 0, 0, radius, 1, -0.1), "no_energy"),
+    }
+    results = {}
+    for name, ((centers, alphas), scheme) in scenarios.items():
+        centers, alphas = centers[::sample], alphas[::sample]
+        colormap = preprocess.colormaps[scheme]
+        timings = {}
+        for radial in (False, True):
+            # The first pass builds the radius index grids, only the second is timed
+            preprocess.render_frames(X, Y, amp, centers, alphas, beta, colormap, label=None, radial=radial)
+            start = time.perf_counter()
+            surface = preprocess.render_frames(X, Y, amp, centers, alphas, beta, colormap, label=None, radial=radial)
+            timings[radial] = (time.perf_counter() - start) / len(alphas), surface
+
+        direct, radial = timings[False][1], timings[True][1]
+        levels = np.abs(direct.astype(np.int16) - radial).max(axis=-1)
+
+        '''Radius table error against the exact normalized profile'''
+        error, bound = 0., 0.
+        for center, alpha in zip(centers, alphas):
+            profile = preprocess.radial_profile(X, Y, center)
+            r = np.sqrt((X - center[0])**2 + (Y - center[1])**2)
+            exact = (1 + r**2 / alpha**2) ** (-beta)
+            exact = (exact - exact.min()) / (exact.max() - exact.min())
+            table = profile.profile(1, alpha, beta)[np.rint((r - profile.radii[0]) / profile.step).astype(int)]
+            error = max(error, np.abs(table - exact).max())
+            bound = max(bound, profile.error_bound(alpha, beta))
+
+        results[name] = {"direct_ms": timings[False][0] * 1000, "radial_ms": timings[True][0] * 1000,
+                         "levels": int(levels.max()), "differing": float((levels > 0).mean()),
+                         "error": error, "bound": bound}
+    return results
+
+if __name__ == "__main__":
+    for name, res in bench_radial().items():
+        print(f"{name:>9}: direct {res['direct_ms']:7.2f} ms/frame, radial {res['radial_ms']:6.2f} ms/frame "
+              f"({res['direct_ms']/res['radial_ms']:.1f}x), {res['differing']*100:.2f}% pixels off by up to {res['levels']} levels, "
+              f"error {res['error']:.2e} <= {res['bound']:.2e}")
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Headless: pygame renders into memory, no display or audio device needed
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pygame
+import draw
+from bench_model import integrate, rho_s, mn
+from button import Button
+from data.colormap import Colormap
+from data.framestore import open_frames
+from data.pipeline import render_sequences
+from data.preprocess_data import Preprocess
+from frames import FrameProvider, RealtimeProvider
+from model import StarModel
+
+'''
+Benchmark suite of the star model and the render pipeline
+
+Every scenario is fixed apart from the resolution of the preprocessed frames,
+the number of animation frames and the window size, so results of two runs
+with the same arguments can be compared. Results are written as JSON:
+    {"meta": {...}, "results": {name: {"value", "unit", "better"}}}
+and compared against a baseline file, a metric that got worse by more than
+the tolerance is a regression and makes the run exit with status 1. Metrics
+that depend on the window carry its size, like draw.realtime.800x800.frame_p99_ms.
+
+    python benchmarks/suite.py --output results.json --baseline benchmarks/baseline.json
+'''
+
+# Star densities of the initial_n scenario
+densities = [200., 500., 1000., rho_s, 3000., 5000.]
+
+def metric(value, unit, better="lower"):
+    return {"value": float(value), "unit": unit, "better": better}
+
+def best_of(function, repeat):
+    # Shortest wall time of repeat calls, in seconds
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def percentiles(times):
+    times = np.asarray(times) * 1000
+    return {"mean": times.mean(), "p50": np.percentile(times, 50), "p99": np.percentile(times, 99)}
+
+def bench_model(repeat=3):
+
+    '''
+    RK4Solver steps per second over the run_calculation loop, and the
+    Newton iterations initial_n needs for a fixed set of densities
+    '''
+
+    model = StarModel()
+    steps = integrate(StarModel.RK4Solver, model)[0]
+    elapsed = best_of(lambda: integrate(StarModel.RK4Solver, model), repeat)
+
+    iterations = []
+    for rho in densities:
+        model.initial_n(rho, mn)
+        iterations.append(model.newton_iterations)
+    newton = best_of(lambda: [model.initial_n(rho, mn) for rho in densities], repeat)
+
+    return {
+        "model.rk4_steps_per_s": metric(steps / elapsed, "steps/s", "higher"),
+        "model.initial_n_iterations": metric(sum(iterations), "iterations"),
+        "model.initial_n_us": metric(newton / len(densities) * 1e6, "us"),
+    }
+
+def bench_preprocess(resolution, frames, repeat=3):
+
+    '''
+    Per frame time of every preprocessing stage at resolution x resolution:
+    Moffat profile, normalisation, colormap and pygame surface, and of the
+    radial render path draw.py preprocesses with
+    '''
+
+    preprocess = Preprocess()
+    x = np.linspace(-20, 20, resolution)
+    X, Y = np.meshgrid(x, x)
+    centers, alphas = preprocess.pulse_params(frames, draw.xc, draw.yc, draw.radius, 0.1)
+    colormap = preprocess.colormaps["normal"]
+
+    star_frames = preprocess.moffat_frames(X, Y, draw.amp, centers, alphas, draw.beta, label=None)
+    normalized = preprocess.normalize_frames(star_frames, label=None)
+    surface = preprocess.colorize_frames(normalized, colormap, label=None)
+    stages = {
+        "moffat": lambda: preprocess.moffat_frames(X, Y, draw.amp, centers, alphas, draw.beta, out=star_frames, label=None),
+        "normalize": lambda: preprocess.normalize_frames(star_frames, out=normalized, label=None),
+        "colormap": lambda: preprocess.colorize_frames(normalized, colormap, out=surface, label=None),
+        "surface": lambda: [pygame.surfarray.make_surface(frame) for frame in surface],
+        "radial": lambda: preprocess.render_frames(X, Y, draw.amp, centers, alphas, draw.beta, colormap, out=surface, label=None),
+    }
+    return {f"preprocess.{resolution}.{stage}_ms": metric(best_of(function, repeat) / frames * 1000, "ms/frame")
+            for stage, function in stages.items()}
+
+def sequence_files(directory, resolution, frames):
+    # Frame files of all draw.py sequences at the given resolution
+    jobs = {name: (os.path.join(directory, f"{name}.frames"), draw.generation_params(name, frames, (resolution, resolution)))
+            for name in draw.sequences}
+    start = time.perf_counter()
+    render_sequences(jobs, processes=1, keyframes=draw.keyframe_sequences)
+    return jobs, time.perf_counter() - start
+
+def load_providers(jobs, size):
+    # As draw.load_data, for the frame files in jobs
+    return {name: FrameProvider(open_frames(path)[0], size=size, keep=True) for name, (path, params) in jobs.items()}
+
+def realtime_providers(jobs, size):
+    providers = {}
+    for name, (path, params) in jobs.items():
+        x0, x1, nx, y0, y1, ny = params["grid"]
+        providers[name] = RealtimeProvider((x0, x1, y0, y1), params["centers"], params["alphas"], params["beta"],
+                                           Colormap(params["colors"], params["lut_size"]), size)
+    return providers
+
+def bench_load(jobs, resolution, window):
+
+    '''
+    Time to open the frame files and show the first frame, until the prefetch
+    window of every sequence is decoded, and to decode and scale one frame
+    '''
+
+    size = draw.fit_to_window(window, window).size
+    prefix = f"load.{resolution}.{window}x{window}"
+    start = time.perf_counter()
+    providers = load_providers(jobs, size)
+    providers["normal"][0]
+    load = time.perf_counter() - start
+    for provider in providers.values():
+        provider.wait()
+    ready = time.perf_counter() - start
+
+    decode = []
+    for provider in providers.values():
+        for index in range(len(provider)):
+            start = time.perf_counter()
+            provider.decode(index)
+            decode.append(time.perf_counter() - start)
+        provider.close()
+    return {
+        f"{prefix}.first_frame_ms": metric(load * 1000, "ms"),
+        f"{prefix}.ready_ms": metric(ready * 1000, "ms"),
+        f"{prefix}.decode_ms": metric(np.mean(decode) * 1000, "ms/frame"),
+    }
+
+def bench_draw(providers, label, window, count, energy_at=10):
+
+    '''
+    Frame time of the draw.py loop without the frame rate cap
+    The energy is removed after energy_at frames, so the run goes through
+    the pulse, the explosion and the white end like a user would.
+    '''
+
+    screen = pygame.display.set_mode((window, window))
+    img_rect = draw.fit_to_window(window, window)
+    energy_button = Button(window / 2 - 150, window - 100, 300, 50, "Remove all energy", (121, 32, 35))
+    animation = draw.Animation(len(providers["normal"]))
+
+    times = []
+    for shown in range(count):
+        if shown == energy_at:
+            animation.remove_energy()
+        start = time.perf_counter()
+        pygame.event.pump()
+        draw.draw_frame(screen, animation, providers, img_rect, energy_button)
+        pygame.display.flip()
+        times.append(time.perf_counter() - start)
+        animation.advance()
+        draw.expect_jump(providers, animation)
+    for provider in providers.values():
+        provider.close()
+
+    stats = percentiles(times)
+    return {f"draw.{label}.{window}x{window}.frame_{name}_ms": metric(value, "ms") for name, value in stats.items()}
+
+def run(scenarios, resolutions, frames, window, draw_frames, repeat=3):
+    results = {}
+    if "model" in scenarios:
+        results.update(bench_model(repeat))
+    for resolution in resolutions:
+        if "preprocess" in scenarios:
+            results.update(bench_preprocess(resolution, frames, repeat))
+        if not {"load", "draw"} & set(scenarios):
+            continue
+        with tempfile.TemporaryDirectory() as directory:
+            jobs, elapsed = sequence_files(directory, resolution, frames)
+            results[f"load.{resolution}.preprocess_s"] = metric(elapsed, "s")
+            if "load" in scenarios:
+                results.update(bench_load(jobs, resolution, window))
+            if "draw" in scenarios:
+                size = draw.fit_to_window(window, window).size
+                results.update(bench_draw(load_providers(jobs, size), f"{resolution}", window, draw_frames))
+                if resolution == resolutions[-1]:
+                    results.update(bench_draw(realtime_providers(jobs, size), "realtime", window, draw_frames))
+    return results
+
+def compare(results, baseline, tolerance):
+
+    '''
+    Prints every metric next to its baseline, returns the names of the regressions
+    results, baseline - output of two runs, as written to the JSON file
+    '''
+
+    if baseline.get("meta", {}).get("arguments") != results.get("meta", {}).get("arguments"):
+        print("Warning: the baseline was run with different arguments")
+    regressions = []
+    for name, result in results["results"].items():
+        value = result["value"]
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            print(f"{name:<45} {value:14.4g} {result['unit']:<10} (no baseline)")
+            continue
+        ratio = value / reference["value"] if reference["value"] else np.inf if value else 1.
+        worse = ratio < 1 - tolerance if result["better"] == "higher" else ratio > 1 + tolerance
+        if worse:
+            regressions.append(name)
+        print(f"{name:<45} {value:14.4g} {result['unit']:<10} {reference['value']:14.4g} {ratio:7.2f}x"
+              f"{'  REGRESSION' if worse else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the star model and the render pipeline")
+    parser.add_argument("--scenarios", nargs="+", default=["model", "preprocess", "load", "draw"],
+                        choices=["model", "preprocess", "load", "draw"])
+    parser.add_argument("--resolution", type=int, nargs="+", default=[800], help="resolutions of the preprocessed frames")
+    parser.add_argument("--frames", type=int, default=40, help="frames of every sequence (even)")
+    parser.add_argument("--window", type=int, default=800, help="window size of the load and draw scenarios")
+    parser.add_argument("--draw-frames", type=int, default=120, help="frames shown in the draw scenarios")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions, the best one is reported")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative change that counts as a regression")
+    args = parser.parse_args()
+    if args.frames % 2:
+        parser.error("--frames has to be even")
+
+    pygame.init()
+    results = run(args.scenarios, args.resolution, args.frames, args.window, args.draw_frames, args.repeat)
+    pygame.quit()
+    print()
+
+    output = {
+        "meta": {"python": platform.python_version(), "numpy": np.__version__, "pygame": pygame.version.ver,
+                 "machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count(),
+                 "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+
+    baseline = {"meta": output["meta"]}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(output, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -9,13 +9,20 @@ class Button:
         self.hover_color = hover_color
         self.font = pygame.font.Font(None, 36)
         self.is_hovered = False
+        # Rendered text per hover state, font.render is too slow to call every frame
+        self._text_surfaces = {}
         
     def draw(self, screen):
         pygame.draw.rect(screen, self.hover_color if self.is_hovered else self.color, self.rect)
-        text_surface = self.font.render(self.text, True, (0, 0, 0))
+        text_surface = self.text_surface()
         text_rect = text_surface.get_rect(center=self.rect.center)
         screen.blit(text_surface, text_rect)
         
+    def text_surface(self):
+        if self.is_hovered not in self._text_surfaces:
+            self._text_surfaces[self.is_hovered] = self.font.render(self.text, True, (0, 0, 0))
+        return self._text_surfaces[self.is_hovered]
+        
     def check_hover(self, mouse_pos):
         self.is_hovered = self.rect.collidepoint(mouse_pos)
         
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+import numpy as np
+
+# Sources whose content defines the results, any edit invalidates the cache
+MODEL_SOURCES = ("model.py", "model_jit.py")
+
+def code_version():
+
+    '''
+    Hash of the model sources (code and constants)
+    '''
+
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in MODEL_SOURCES:
+        with open(os.path.join(here, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+class SolutionCache:
+
+    '''
+    Two tier cache of StarModel.solve results
+    maxsize - number of solutions kept in memory (least recently used are dropped)
+    directory - optional on-disk store, one .npz per solution named by its key
+    Stored profiles are made read-only, every get returns its own StarSolution
+    sharing them, so callers can not change what later hits see.
+    '''
+
+    def __init__(self, maxsize=128, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.version = code_version()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, solver, rho_s, mn, flag, options):
+
+        '''
+        Content address of a solve call, includes the model code version
+        '''
+
+        inputs = {"version": self.version, "solver": solver, "rho_s": float(rho_s), "mn": float(mn),
+                  "flag": int(flag), "options": {k: float(v) for k, v in sorted(options.items())}}
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".npz")
+
+    def get(self, key):
+
+        '''
+        Returns the cached StarSolution or None
+        '''
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return replace(self._memory[key])
+
+        solution = self._load(key) if self.directory is not None else None
+        with self._lock:
+            if solution is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, solution)
+        return replace(solution)
+
+    def put(self, key, solution):
+        self._remember(key, replace(solution))
+        if self.directory is not None:
+            self._store(key, solution)
+
+    def _remember(self, key, solution):
+        for profile in (solution.r, solution.m, solution.p):
+            profile.flags.writeable = False
+        with self._lock:
+            self._memory[key] = solution
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def _store(self, key, solution):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        summary = {"rho_s": solution.rho_s, "mn": solution.mn, "flag": solution.flag, "mass": solution.mass,
+                   "radius": solution.radius, "converged": solution.converged, "status": solution.status}
+        # Written under a temporary name so readers never see half a file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, r=solution.r, m=solution.m, p=solution.p,
+                     summary=json.dumps({k: v if isinstance(v, str) else float(v) for k, v in summary.items()}))
+        os.replace(tmp, path)
+
+    def _load(self, key):
+        from model import StarSolution
+
+        try:
+            with np.load(self._path(key)) as data:
+                summary = json.loads(str(data["summary"]))
+                return StarSolution(rho_s=summary["rho_s"], mn=summary["mn"], flag=int(summary["flag"]),
+                                    r=data["r"], m=data["m"], p=data["p"], mass=summary["mass"],
+                                    radius=summary["radius"], converged=bool(summary["converged"]),
+                                    status=summary["status"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def clear(self):
+
+        '''
+        Empties the memory tier, the disk store is left alone
+        '''
+
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+
+        '''
+        Hit/miss counters, hit_rate counts memory and disk hits
+        '''
+
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "size": len(self._memory), "hit_rate": (self.hits + self.disk_hits)/total if total else 0.}
@@ -0,0 +1,36 @@
+import numpy as np
+
+class Colormap:
+
+    '''
+    Piecewise linear colormap baked into a uint8 RGB lookup table
+    stops - [(position, (r, g, b)), ...] with positions between 0 and 1
+    size - number of entries of the table (256 or 4096 are sensible)
+    '''
+
+    def __init__(self, stops, size=4096):
+        self.stops = stops
+        self.size = size
+        positions = [point[0] for point in stops]
+        samples = np.linspace(0, 1, size)
+        self.lut = np.stack([np.interp(samples, positions, [point[1][channel] for point in stops])
+                             for channel in range(3)], axis=-1).astype(np.uint8)
+
+    def indices(self, normalized):
+
+        '''
+        Quantizes values in [0, 1] to table indices
+        '''
+
+        scaled = np.multiply(normalized, self.size - 1, dtype=np.float32)
+        scaled += 0.5
+        return scaled.astype(np.uint16)
+
+    def apply(self, normalized, out=None):
+
+        '''
+        Colors of the values in [0, 1], one gather from the table
+        out - optional uint8 array of shape normalized.shape + (3,) written in place
+        '''
+
+        return np.take(self.lut, self.indices(normalized), axis=0, out=out, mode="clip")
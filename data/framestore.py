@@ -0,0 +1,231 @@
+import hashlib
+import json
+import struct
+import threading
+from collections import OrderedDict
+import zlib
+import numpy as np
+from data.radial import unfold
+
+'''
+Preprocessed animation frames on disk
+
+Layout of a .frames file:
+    8 bytes   magic b"SEVFRAME"
+    4 bytes   format version (little endian uint32)
+    4 bytes   length of the JSON header (little endian uint32)
+    JSON      {"version", "shape", "dtype", "offset", "params", "frames"}
+    padding   up to "offset", a multiple of ALIGNMENT
+    data      the encoded frames
+
+The frames are pygame surface data, (frames, W, H, 3) uint8 RGB. Every entry
+of "frames" says how one frame is stored:
+    {"ref": j}                    same pixels as frame j, nothing stored
+    {"key": [start, length],      zlib compressed frame
+     "block": [qx, qy]}
+    {"delta": [start, length],    zlib compressed difference (modulo 256)
+     "block": [qx, qy],           to frame j, the previous frame of its run
+     "base": j}
+start is relative to "offset". Mirror symmetric frames only store the
+[:qx, :qy] block, the rest is mirrored from it (data.radial.unfold). Version 1 files, the raw array after the
+header without a "frames" table, can still be read.
+'''
+
+MAGIC = b"SEVFRAME"
+VERSION = 2
+ALIGNMENT = 4096
+PREAMBLE = struct.Struct("<8sII")
+
+def _header(shape, params, frames):
+    header = {"version": VERSION, "shape": list(shape), "dtype": "uint8", "params": params, "frames": frames}
+    # The offset is part of the header, so grow it until header and offset agree
+    offset = ALIGNMENT
+    while True:
+        header["offset"] = offset
+        encoded = json.dumps(header).encode()
+        if PREAMBLE.size + len(encoded) <= offset:
+            return encoded, offset
+        offset += ALIGNMENT
+
+def encode_run(blocks, level=1, interval=8):
+
+    '''
+    Encodes the blocks of consecutive distinct frames, yields ("key", data) or ("delta", data)
+    A block is the whole frame or, for a mirror symmetric frame, the
+    [:qx, :qy] corner that data.radial.unfold mirrors onto the rest.
+    Every interval-th frame is a keyframe, the frames in between are stored
+    as the difference to their predecessor when it has the same block shape.
+    Smooth gradients can make a difference compress worse than the frame
+    itself, then the rest of the interval is stored as keyframes, so at most
+    one frame per interval is compressed twice.
+    '''
+
+    previous = None
+    key_size = 0
+    for position, block in enumerate(blocks):
+        if position % interval == 0:
+            deltas = True
+        elif deltas and block.shape == previous.shape:
+            data = zlib.compress(np.subtract(block, previous, dtype=np.uint8), level)
+            if len(data) <= key_size:
+                yield "delta", data
+                previous = block
+                continue
+            deltas = False
+        data = zlib.compress(np.ascontiguousarray(block), level)
+        if position % interval == 0:
+            key_size = len(data)
+        yield "key", data
+        previous = block
+
+def write_frames(path, shape, params, frames):
+
+    '''
+    Writes a frame file from already encoded frames
+    shape - (frames, W, H, 3)
+    params - JSON serialisable generation parameters stored in the header
+    frames - one entry per frame: ("ref", j), or ("key" or "delta", (qx, qy), data)
+             from encode_run with the block size, a delta is relative to the previous frame
+    '''
+
+    table = []
+    blobs = []
+    start = 0
+    for index, entry in enumerate(frames):
+        if entry[0] == "ref":
+            table.append({"ref": int(entry[1])})
+            continue
+        kind, block, data = entry
+        table.append({kind: [start, len(data)], "block": [int(block[0]), int(block[1])]})
+        if kind == "delta":
+            table[-1]["base"] = index - 1
+        blobs.append(data)
+        start += len(data)
+
+    encoded, offset = _header(shape, params, table)
+    with open(path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        f.seek(offset)
+        for data in blobs:
+            f.write(data)
+
+def save_frames(path, surface_data, params, level=1, interval=8):
+
+    '''
+    Writes a whole (frames, W, H, 3) uint8 array to a frame file
+    Frames repeating an earlier one are stored as references, runs of the
+    remaining frames as keyframes and deltas.
+    '''
+
+    seen = {}
+    frames = []
+    run = []
+    def flush():
+        for index, (kind, data) in zip(run, encode_run((surface_data[i] for i in run), level, interval)):
+            frames[index] = (kind, surface_data.shape[1:3], data)
+        run.clear()
+
+    for index, frame in enumerate(surface_data):
+        digest = hashlib.blake2b(np.ascontiguousarray(frame), digest_size=16).digest()
+        if digest in seen and np.array_equal(surface_data[seen[digest]], frame):
+            flush()
+            frames.append(("ref", seen[digest]))
+        else:
+            seen.setdefault(digest, index)
+            frames.append(None)
+            run.append(index)
+    flush()
+    write_frames(path, surface_data.shape, params, frames)
+
+def read_header(path):
+
+    '''
+    Header dict of a frame file, raises ValueError if it isn't one
+    '''
+
+    with open(path, "rb") as f:
+        preamble = f.read(PREAMBLE.size)
+        if len(preamble) < PREAMBLE.size:
+            raise ValueError(f"{path} is not a frame file")
+        magic, version, length = PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a frame file")
+        if version not in (1, VERSION):
+            raise ValueError(f"{path} has frame format version {version}, expected {VERSION}")
+        return json.loads(f.read(length))
+
+class FrameSequence:
+
+    '''
+    Frames of a frame file, decoded when they are indexed
+    Behaves like a read-only (frames, W, H, 3) uint8 array for len() and
+    integer indexing. The last cache decoded frames are kept, enough for the
+    base of the next delta, FrameProvider keeps the frames at display size.
+    The lock only guards the cache, threads decode frames at the same time.
+    '''
+
+    def __init__(self, path, header, cache=2):
+        self.path = path
+        self.shape = tuple(header["shape"])
+        self.table = header["frames"]
+        self.cache = cache
+        self._data = np.memmap(path, dtype=np.uint8, mode="r", offset=header["offset"])
+        self._decoded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def reference(self, index):
+        # Index of the frame whose pixels frame index has
+        index = range(len(self))[index]
+        return self.table[index].get("ref", index)
+
+    def __getitem__(self, index):
+        index = self.reference(index)
+        with self._lock:
+            if index in self._decoded:
+                self._decoded.move_to_end(index)
+                return self._decoded[index]
+        entry = self.table[index]
+        if "key" in entry:
+            frame = self._decode(entry["key"], entry["block"])
+        else:
+            frame = np.add(self[entry["base"]], self._decode(entry["delta"], entry["block"]), dtype=np.uint8)
+        with self._lock:
+            self._decoded[index] = frame
+            self._decoded.move_to_end(index)
+            if len(self._decoded) > self.cache:
+                self._decoded.popitem(last=False)
+        return frame
+
+    def _decode(self, blob, block):
+        start, length = blob
+        qx, qy = block
+        data = np.frombuffer(zlib.decompress(self._data[start:start + length]), dtype=np.uint8)
+        if (qx, qy) == self.shape[1:3]:
+            return data.reshape(self.shape[1:])
+        frame = np.empty(self.shape[1:], dtype=np.uint8)
+        frame[:qx, :qy] = data.reshape(qx, qy, -1)
+        return unfold(frame, qx, qy)
+
+    @property
+    def nbytes(self):
+        # Bytes of encoded frame data
+        return len(self._data)
+
+def open_frames(path):
+
+    '''
+    Opens a frame file without reading the frames
+    Returns the frames, indexable like a (frames, W, H, 3) uint8 array, and
+    the generation parameters
+    '''
+
+    header = read_header(path)
+    if header["version"] == 1:
+        frames = np.memmap(path, dtype=header["dtype"], mode="r", offset=header["offset"], shape=tuple(header["shape"]))
+    else:
+        frames = FrameSequence(path, header)
+    return frames, header["params"]
@@ -0,0 +1,132 @@
+import os
+from multiprocessing import Pool
+import numpy as np
+from data.colormap import Colormap
+from data.framestore import encode_run, write_frames
+from data.preprocess_data import Preprocess
+
+'''
+Parallel preprocessing of animation sequences
+
+Frames with the same generation parameters as an earlier frame of their
+sequence, like the way back of a pulse, are not rendered but stored as
+references. The remaining frames are split into blocks of consecutive frames,
+every block is an independent task: a worker rebuilds the grid and colormap
+from the generation parameters, renders the block and encodes it (see
+framestore.encode_run), only the compressed frames travel back to be written.
+Mirror symmetric frames are only rendered and stored up to their mirror axes.
+'''
+
+# Per worker state: grids and colormaps
+_grids = {}
+_colormaps = {}
+_preprocess = None
+
+def _grid(spec):
+    spec = tuple(spec)
+    if spec not in _grids:
+        x0, x1, nx, y0, y1, ny = spec
+        _grids[spec] = np.meshgrid(np.linspace(x0, x1, int(nx)), np.linspace(y0, y1, int(ny)))
+    return _grids[spec]
+
+def _colormap(stops, size):
+    key = (repr(stops), size)
+    if key not in _colormaps:
+        _colormaps[key] = Colormap(stops, size)
+    return _colormaps[key]
+
+def frame_references(params, decimals=9):
+
+    '''
+    Index of the first frame with the same center and alpha, for every frame
+    Parameters are compared after rounding to decimals, so a pulse computed
+    up and down again still finds its frames.
+    '''
+
+    first = {}
+    references = []
+    for index, (center, alpha) in enumerate(zip(params["centers"], params["alphas"])):
+        key = tuple(np.round([center[0], center[1], alpha], decimals))
+        references.append(first.setdefault(key, index))
+    return references
+
+def render_block(params, indices, level=1, interval=8):
+
+    '''
+    Renders and encodes the consecutive frames indices of a sequence
+    Only the block of each frame that is not mirrored is rendered (see
+    data.radial). Returns a list of (index, "key" or "delta", (qx, qy), data)
+    '''
+
+    global _preprocess
+    if _preprocess is None:
+        _preprocess = Preprocess()
+    X, Y = _grid(params["grid"])
+    colormap = _colormap(params["colors"], params["lut_size"])
+    profiles = [_preprocess.radial_profile(X, Y, params["centers"][index]) for index in indices]
+
+    blocks = (profile.gather(params["amp"], params["alphas"][index], params["beta"], colormap)
+              for index, profile in zip(indices, profiles))
+    return [(index, kind, profile.index.shape, data)
+            for index, profile, (kind, data) in zip(indices, profiles, encode_run(blocks, level, interval))]
+
+def _render_task(task):
+    name, params, indices, level, interval = task
+    return name, render_block(params, indices, level, interval)
+
+def render_sequences(jobs, processes=None, level=1, interval=8, keyframes=()):
+
+    '''
+    Renders the frame files of several sequences in parallel
+    jobs - {name: (path, params)}, params as stored in the header: grid
+           [x0, x1, nx, y0, y1, ny], amp, beta, centers, alphas, colors and lut_size
+    processes - worker processes, None for all cores, 1 renders in this process
+    level - zlib compression level
+    interval - frames per block, each block starts with a keyframe
+    keyframes - names of sequences stored as keyframes only, for sequences
+                playback can enter at any frame, so no frame needs its predecessors
+    '''
+
+    tasks = []
+    encoded = {}
+    references = {}
+    for name, (path, params) in jobs.items():
+        references[name] = frame_references(params)
+        encoded[name] = [("ref", ref) if ref != index else None for index, ref in enumerate(references[name])]
+        step = 1 if name in keyframes else interval
+        # Blocks of consecutive distinct frames, a reference ends a block
+        block = []
+        for index, ref in enumerate(references[name] + [-1]):
+            if ref == index and len(block) < interval:
+                block.append(index)
+                continue
+            if block:
+                tasks.append((name, params, block, level, step))
+            block = [index] if ref == index else []
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(tasks))
+
+    unique = {name: sum(ref == index for index, ref in enumerate(references[name])) for name in jobs}
+    done = {name: 0 for name in jobs}
+    def report(name, block):
+        for index, kind, shape, data in block:
+            encoded[name][index] = (kind, shape, data)
+        done[name] += len(block)
+        progress = ", ".join(f"{name} {count}/{unique[name]}" for name, count in done.items())
+        print(f"\rCooking frames: {sum(done.values())}/{sum(unique.values())} ({progress})", end="", flush=True)
+
+    if processes <= 1:
+        for task in tasks:
+            report(*_render_task(task))
+    else:
+        with Pool(processes) as pool:
+            for name, block in pool.imap_unordered(_render_task, tasks):
+                report(name, block)
+
+    for name, (path, params) in jobs.items():
+        x0, x1, nx, y0, y1, ny = params["grid"]
+        write_frames(path, (len(params["alphas"]), int(nx), int(ny), 3), params, encoded[name])
+    reused = sum(len(references[name]) - unique[name] for name in jobs)
+    print(f" Done ({reused} repeated frames stored as references)")
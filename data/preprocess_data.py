@@ -1,5 +1,6 @@
 import numpy as np
-import pygame
+from data.colormap import Colormap
+from data.radial import RadialProfile
 
 class Preprocess:
     
@@ -7,152 +8,232 @@ class Preprocess:
         # Colors
         self.colors = [(0, (0, 0, 0)), (0.2, (186, 51, 54)), (1, (255, 255, 0))]
         self.no_energy_color = [(0.08, (0, 0, 0)), (0.2, (255, 255, 255))]
-        # Interpolate colors for the colormap
-        self.colormap = np.linspace(0, 1, 256)
-        self.r_interp = np.interp(self.colormap, [point[0] for point in self.colors], [point[1][0] for point in self.colors])
-        self.g_interp = np.interp(self.colormap, [point[0] for point in self.colors], [point[1][1] for point in self.colors])
-        self.b_interp = np.interp(self.colormap, [point[0] for point in self.colors], [point[1][2] for point in self.colors])
-
-        # Prefefine color for the energy removal event
-        self.removal_colormap = np.linspace(0, 1, 256)
-        self.removal_r_interp = np.interp(self.removal_colormap, [point[0] for point in self.no_energy_color], [point[1][0] for point in self.no_energy_color])
-        self.removal_g_interp = np.interp(self.removal_colormap, [point[0] for point in self.no_energy_color], [point[1][1] for point in self.no_energy_color])
-        self.removal_b_interp = np.interp(self.removal_colormap, [point[0] for point in self.no_energy_color], [point[1][2] for point in self.no_energy_color])
+        # Lookup tables of every color scheme, new schemes only need an entry here
+        self.colormaps = {
+            "normal": Colormap(self.colors),
+            "no_energy": Colormap(self.no_energy_color),
+        }
+        # Radius index grids of the radial render path, per grid and center
+        self.profiles = {}
     
     def moffat(self, x, y, amp, xc, yc, alpha, beta):
         r = np.sqrt((x - xc)**2 + (y - yc)**2)
         return amp * (1 + r ** 2 / alpha**2) ** (-beta)
-    
+
+    def moffat_frames(self, X, Y, amp, centers, alphas, beta, out=None, chunk=8, label="Cooking animation"):
+        
+        '''
+        Moffat profile of a whole animation written into one (frames, H, W) float32 array
+        centers - (xc, yc) of every frame
+        alphas - alpha of every frame
+        The squared radius grid is only computed when the center moves, runs of
+        frames sharing a center are evaluated chunk frames at a time by
+        broadcasting over their alphas, in place so no temporaries pile up.
+        '''
+        
+        centers = np.asarray(centers, dtype=np.float64)
+        alphas = np.asarray(alphas, dtype=np.float64)
+        frames = len(alphas)
+        if out is None:
+            out = np.empty((frames,) + X.shape, dtype=np.float32)
+        
+        start = 0
+        while start < frames:
+            # Run of consecutive frames with the same center
+            end = start + 1
+            while end < frames and np.array_equal(centers[end], centers[start]):
+                end += 1
+            xc, yc = centers[start]
+            r2 = ((X - xc)**2 + (Y - yc)**2).astype(np.float32)
+            
+            for first in range(start, end, chunk):
+                last = min(first + chunk, end)
+                block = out[first:last]
+                a2 = (alphas[first:last]**2).astype(np.float32)[:, None, None]
+                np.divide(r2, a2, out=block)
+                block += 1
+                np.power(block, np.float32(-beta), out=block)
+                block *= amp
+                if label:
+                    print(f"\r{label}: {last}/{frames}", end="", flush=True)
+            start = end
+        if label:
+            print(" Done")
+        
+        return out
+
+    def pulse_params(self, frames, xc, yc, radius, delta):
+        
+        '''
+        Centers and alphas of the pulsing star: alpha grows by delta for half
+        of the frames and shrinks back the same way in the second half
+        '''
+        
+        half = int(frames / 2)
+        end_value = delta * (half - 1)
+        alphas = [radius + delta * i for i in range(half)]
+        alphas += [(radius + end_value) + delta * i for i in range(0, -half, -1)]
+        return np.tile([xc, yc], (len(alphas), 1)), np.array(alphas)
+
+    def explosion_params(self, frames, xc, yc, radius, deltaShake, deltaDecrease):
+        
+        '''
+        Centers and alphas of the explosion: the star shakes by deltaShake
+        (right, left, up, down) while shrinking, then blows up
+        '''
+        
+        centers = []
+        alphas = []
+        current = 1
+        end_frame = int(frames / 2)
+        end_value = -1
+        for i in range(end_frame):
+            if current == 1:
+                xc += deltaShake
+            elif current == 2:
+                xc -= deltaShake
+            elif current == 3:
+                yc += deltaShake
+            elif current == 4:
+                yc -= deltaShake
+            
+            if current == 4:
+                current = 1
+            else:
+                current += 1
+            
+            centers.append((xc, yc))
+            alphas.append(radius + deltaDecrease * i)
+            if i == frames / 2 - 1:
+                end_value = deltaDecrease * i
+        for i in range(end_frame, frames):
+            i -= end_frame
+            centers.append((xc, yc))
+            alphas.append((radius + end_value) + (i/10) ** (1+(i/4)))
+        return np.array(centers), np.array(alphas)
+
+    def normalize_frames(self, star_frames, out=None, label="Cooking normalized data"):
+        
+        '''
+        Scales every frame to [0, 1] by its own minimum and maximum
+        out may be star_frames itself to normalize in place
+        '''
+        
+        lo = star_frames.min(axis=(1, 2), keepdims=True)
+        hi = star_frames.max(axis=(1, 2), keepdims=True)
+        normalized_data = np.subtract(star_frames, lo, out=out)
+        normalized_data /= hi - lo
+        if label:
+            print(f"\r{label}: {len(star_frames)}/{len(star_frames)} Done")
+        return normalized_data
+
+    def colorize_frames(self, normalized_data, colormap, out=None, label="Cooking surface"):
+        
+        '''
+        RGB surface data of every frame, shape (frames, W, H, 3) uint8
+        Frames are rotated like np.rot90 so each one can be handed to
+        pygame.surfarray.make_surface, the rotation is only a view.
+        '''
+        
+        frames = len(normalized_data)
+        if out is None:
+            out = np.empty((frames,) + normalized_data.shape[:0:-1] + (3,), dtype=np.uint8)
+        for frame in range(frames):
+            colormap.apply(np.rot90(normalized_data[frame]), out=out[frame])
+            if label:
+                print(f"\r{label}: {frame+1}/{frames}", end="", flush=True)
+        if label:
+            print(" Done")
+        return out
+
+    def radial_profile(self, X, Y, center):
+
+        '''
+        Cached RadialProfile of a np.meshgrid grid around center
+        '''
+
+        x, y = X[0], Y[:, 0]
+        key = (x[0], x[-1], len(x), y[0], y[-1], len(y), float(center[0]), float(center[1]))
+        if key not in self.profiles:
+            self.profiles[key] = RadialProfile(x, y, center)
+        return self.profiles[key]
+
+    def render_frames(self, X, Y, amp, centers, alphas, beta, colormap, out=None, chunk=8, label="Cooking frames", radial=True):
+
+        '''
+        Surface data only, for playback: Moffat profile, normalisation and
+        colormap are applied chunk frames at a time, so the float frames never
+        exist for the whole animation at once.
+        out - (frames, W, H, 3) uint8 array
+        radial - evaluate the profile on a radius table and gather it per pixel
+                 (see data.radial), False computes every pixel directly
+        '''
+
+        frames = len(alphas)
+        if out is None:
+            out = np.empty((frames,) + X.shape[::-1] + (3,), dtype=np.uint8)
+        if radial:
+            for frame in range(frames):
+                self.radial_profile(X, Y, centers[frame]).render(amp, alphas[frame], beta, colormap, out=out[frame])
+                if label:
+                    print(f"\r{label}: {frame+1}/{frames}", end="", flush=True)
+            if label:
+                print(" Done")
+            return out
+        scratch = np.empty((min(chunk, frames),) + X.shape, dtype=np.float32)
+        for first in range(0, frames, chunk):
+            last = min(first + chunk, frames)
+            block = scratch[:last - first]
+            self.moffat_frames(X, Y, amp, centers[first:last], alphas[first:last], beta, out=block, chunk=chunk, label=None)
+            self.normalize_frames(block, out=block, label=None)
+            self.colorize_frames(block, colormap, out=out[first:last], label=None)
+            if label:
+                print(f"\r{label}: {last}/{frames}", end="", flush=True)
+        if label:
+            print(" Done")
+        return out
+
     def preproccess_Normal_Data(self, frames, X, Y, amp, xc, yc, radius, beta, delta):
         animation_frames = frames
-        end_iter = -1
-        end_value = -1
         
-        star_frames = []
         # Precompute frames
-        for i in range(int(animation_frames / 2)):
-            star_frames.append(self.moffat(X, Y, amp, xc, yc, radius + delta * i, beta))
-            print(f"\rCooking animation: {i+1}/{animation_frames}", end="", flush=True)
-            if i == animation_frames / 2 - 1:
-                end_iter = i + 1
-                end_value = delta * i
-        print(" Done")
-        for i in range(0, -int(animation_frames / 2), -1):
-            star_frames.append(self.moffat(X, Y, amp, xc, yc, (radius + end_value) + delta * i, beta))
-            print(f"\rCooking animation 2: {abs(i)+1+end_iter}/{animation_frames}", end="", flush=True)
-        print(" Done")
+        centers, alphas = self.pulse_params(animation_frames, xc, yc, radius, delta)
+        star_frames = self.moffat_frames(X, Y, amp, centers, alphas, beta)
 
         # Precompute the normalized data
-        normalized_data = []
-        for frame in range(animation_frames):
-            normalized_data.append((star_frames[frame] - np.min(star_frames[frame])) / (np.max(star_frames[frame]) - np.min(star_frames[frame])))
-            print(f"\rCooking normalized data: {frame+1}/{animation_frames}", end="", flush=True)
-        print(" Done")
+        normalized_data = self.normalize_frames(star_frames)
 
         # Precompute surface
-        precompiled_surface = []
-        for frame in range(animation_frames):
-            precompiled_surface.append(pygame.surfarray.make_surface(np.rot90(np.stack((
-                    np.interp(normalized_data[frame], self.colormap, self.r_interp),
-                    np.interp(normalized_data[frame], self.colormap, self.g_interp),
-                    np.interp(normalized_data[frame], self.colormap, self.b_interp),
-            ), axis=-1)).astype(np.uint8)))
-            print(f"\rCooking surface: {frame+1}/{animation_frames}", end="", flush=True)
-        print(" Done")
+        precompiled_surface = self.colorize_frames(normalized_data, self.colormaps["normal"])
         
         return star_frames, normalized_data, precompiled_surface
 
     def preproccess_AntiEnergy_Data(self, frames, X, Y, amp, xc, yc, radius, beta, delta):
-        end_iter = -1
-        end_value = -1
         animation_frames = frames
         
-        star_frames = []
         # Precompute frames
-        for i in range(int(animation_frames / 2)):
-            star_frames.append(self.moffat(X, Y, amp, xc, yc, radius + delta * i, beta))
-            print(f"\rCooking animation: {i+1}/{animation_frames}", end="", flush=True)
-            if i == animation_frames / 2 - 1:
-                end_iter = i + 1
-                end_value = delta * i
-        print(" Done")
-        for i in range(0, -int(animation_frames / 2), -1):
-            star_frames.append(self.moffat(X, Y, amp, xc, yc, (radius + end_value) + delta * i, beta))
-            print(f"\rCooking animation 2: {abs(i)+1+end_iter}/{animation_frames}", end="", flush=True)
-        print(" Done")
+        centers, alphas = self.pulse_params(animation_frames, xc, yc, radius, delta)
+        star_frames = self.moffat_frames(X, Y, amp, centers, alphas, beta)
 
         # Precompute the normalized data
-        normalized_data = []
-        for frame in range(animation_frames):
-            normalized_data.append((star_frames[frame] - np.min(star_frames[frame])) / (np.max(star_frames[frame]) - np.min(star_frames[frame])))
-            print(f"\rCooking normalized data: {frame+1}/{animation_frames}", end="", flush=True)
-        print(" Done")
+        normalized_data = self.normalize_frames(star_frames)
 
         # Precompute surface
-        precompiled_surface = []
-        for frame in range(animation_frames):
-            precompiled_surface.append(pygame.surfarray.make_surface(np.rot90(np.stack((
-                    np.interp(normalized_data[frame], self.removal_colormap, self.removal_r_interp),
-                    np.interp(normalized_data[frame], self.removal_colormap, self.removal_g_interp),
-                    np.interp(normalized_data[frame], self.removal_colormap, self.removal_b_interp),
-            ), axis=-1)).astype(np.uint8)))
-            print(f"\rCooking surface: {frame+1}/{animation_frames}", end="", flush=True)
-        print(" Done")
+        precompiled_surface = self.colorize_frames(normalized_data, self.colormaps["no_energy"])
         
         return star_frames, normalized_data, precompiled_surface
     
     def preproccess_Exploding_Data(self, frames, X, Y, amp, xc, yc, radius, beta, deltaShake, deltaDecrease):
-        end_iter = -1
-        end_value = -1
         animation_frames = frames
         
-        star_frames = []
         # Precompute frames
-        current = 1
-        end_frame = int(animation_frames / 2)
-        for i in range(end_frame):
-            if current == 1:
-                xc += deltaShake
-            elif current == 2:
-                xc -= deltaShake
-            elif current == 3:
-                yc += deltaShake
-            elif current == 4:
-                yc -= deltaShake
-            
-            if current == 4:
-                current = 1
-            else:
-                current += 1
-            
-            star_frames.append(self.moffat(X, Y, amp, xc, yc, radius + deltaDecrease * i, beta))
-            print(f"\rCooking animation: {i+1}/{animation_frames}", end="", flush=True)
-            if i == animation_frames / 2 - 1:
-                end_iter = i + 1
-                end_value = deltaDecrease * i
-        print(" Done")
-        for i in range(end_frame, animation_frames):
-            i -= end_frame
-            star_frames.append(self.moffat(X, Y, amp, xc, yc, (radius + end_value) + (i/10) ** (1+(i/4)), beta))
-            print(f"\rCooking animation 2: {abs(i)+1+end_iter}/{animation_frames}", end="", flush=True)
-        print(" Done")
+        centers, alphas = self.explosion_params(animation_frames, xc, yc, radius, deltaShake, deltaDecrease)
+        star_frames = self.moffat_frames(X, Y, amp, centers, alphas, beta)
 
         # Precompute the normalized data
-        normalized_data = []
-        for frame in range(animation_frames):
-            normalized_data.append((star_frames[frame] - np.min(star_frames[frame])) / (np.max(star_frames[frame]) - np.min(star_frames[frame])))
-            print(f"\rCooking normalized data: {frame+1}/{animation_frames}", end="", flush=True)
-        print(" Done")
+        normalized_data = self.normalize_frames(star_frames)
 
         # Precompute surface
-        precompiled_surface = []
-        for frame in range(animation_frames):
-            precompiled_surface.append(pygame.surfarray.make_surface(np.rot90(np.stack((
-                    np.interp(normalized_data[frame], self.removal_colormap, self.removal_r_interp),
-                    np.interp(normalized_data[frame], self.removal_colormap, self.removal_g_interp),
-                    np.interp(normalized_data[frame], self.removal_colormap, self.removal_b_interp),
-            ), axis=-1)).astype(np.uint8)))
-            print(f"\rCooking surface: {frame+1}/{animation_frames}", end="", flush=True)
-        print(" Done")
+        precompiled_surface = self.colorize_frames(normalized_data, self.colormaps["no_energy"])
         
         return star_frames, normalized_data, precompiled_surface
\ No newline at end of file
@@ -1,5 +1,13 @@
 from button import Button
 from data.preprocess_data import Preprocess
+from data.framestore import open_frames
+from data.pipeline import render_sequences
+from frames import FrameProvider, RealtimeProvider
+from instrument import Overlay, Timings, disabled
+import argparse
+import json
+import os
+import time
 import pygame
 import numpy as np
 
@@ -16,116 +24,242 @@ X, Y = np.meshgrid(x, y)
 
 # Generate Moffat star data for the entire animation
 animation_frames = 40 # Can NOT be an odd number
+prefetch_frames = 4 # Decoded ahead of the animation
+keyframe_sequences = ("antienergy",) # The energy button enters them at any frame
 
-def saveData(name, star_frames, normalized_data, precompiled_surface):
-    precompiled_surface_array = [pygame.surfarray.array3d(surface) for surface in precompiled_surface]
-    np.savez(name, star_frames=star_frames, normalized_data=normalized_data, precompiled_surface=precompiled_surface_array)
-    
-def load_data(name):
-    loaded_data = np.load(name)
-    star_frames = loaded_data["star_frames"]
-    normalized_data = loaded_data["normalized_data"]
-    precompiled_surface_array = loaded_data["precompiled_surface"]
-    precompiled_surface = [pygame.surfarray.make_surface(np.rot90(surface).astype(np.uint8)) for surface in precompiled_surface_array]
-    
-    return star_frames, normalized_data, precompiled_surface
-
-input_data = -1
-print("Re-process or load data? 0 -> Pre-process, 1 -> Load (Type 0 if this is your first time running this file.)")
-while input_data != "0" and input_data != "1":
-    input_data = input()
-
-if input_data == "0":
-    preprocess_data = Preprocess()
-    print("Standard Data preprocessing...")
-    star_frames, normalized_data, precompiled_surface = preprocess_data.preproccess_Normal_Data(animation_frames, X, Y, amp, xc, yc, radius, beta, 0.1)
-    print("\nEnergy Removal Data preprocessing...")
-    energy_removal_star_frames, energy_removal_normalized_data, energy_removal_precompiled_surface = preprocess_data.preproccess_AntiEnergy_Data(animation_frames, X, Y, amp, xc, yc, radius, beta, 0.1)
-    print("\nExplosion Data preprocessing...")
-    exploding_star_frames, exploding_normalized_data, exploding_precompiled_surface = preprocess_data.preproccess_Exploding_Data(animation_frames, X, Y, amp, xc, yc, radius, beta, 1, -0.1)
-    saveData("data/preprocessed_normal_data.npz", star_frames, normalized_data, precompiled_surface)
-    saveData("data/preprocessed_antienergy_data.npz", energy_removal_star_frames, energy_removal_normalized_data, energy_removal_precompiled_surface)
-    saveData("data/preprocessed_exploding_data.npz", exploding_star_frames, exploding_normalized_data, exploding_precompiled_surface)
-else:
-    print("Loading data...")
-    star_frames, normalized_data, precompiled_surface = load_data("data/preprocessed_normal_data.npz")
-    energy_removal_star_frames, energy_removal_normalized_data, energy_removal_precompiled_surface = load_data("data/preprocessed_antienergy_data.npz")
-    exploding_star_frames, exploding_normalized_data, exploding_precompiled_surface = load_data("data/preprocessed_exploding_data.npz")
-
-# Initialize Pygame
-pygame.init()
-
-# Set up Pygame window
-width, height = 800, 800
-screen = pygame.display.set_mode((width, height))
-pygame.display.set_caption('Moffat Star')
-clock = pygame.time.Clock()
-
-# Scale the image to fit the entire screen
-scale_factor = min(width / X.shape[1], height / X.shape[0])
-img_surface = pygame.surfarray.make_surface(np.rot90(star_frames[0]))
-img_surface = pygame.transform.scale(img_surface, (int(X.shape[1] * scale_factor), int(X.shape[0] * scale_factor)))
-
-img_rect = img_surface.get_rect(center=(width / 2, height / 2))
-
-#Energy button
-energy_button = Button(250, 700, 300, 50, "Remove all energy", (121, 32, 35))
-
-running = True
-run_animation = True
-run_explosion = False
-return_to_beginning_state = False
-reached_explosion_end = False
-frame = 0
-
-energy_removed = False
-surface_used = precompiled_surface
-
-while running and frame < 50:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.MOUSEMOTION:
-            energy_button.check_hover(pygame.mouse.get_pos())
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if energy_button.check_click(pygame.mouse.get_pos()):
-                energy_removed = True
-    
-    if energy_removed:
-        #Change star color to yellow
-        yellow_color = np.array([255, 255, 0])
-        surface_used = energy_removal_precompiled_surface
-        return_to_beginning_state = True
-        
-        energy_removed = False
-    if run_explosion:
-        # Activate shake
-        surface_used = exploding_precompiled_surface
-
-    surface = pygame.transform.scale(surface_used[frame], (int(X.shape[1] * scale_factor), int(X.shape[0] * scale_factor)))
-    if reached_explosion_end:
+preprocess_data = Preprocess()
+
+def make_sequences(frames):
+    # Animation sequences: file, (centers, alphas) of every frame and color scheme
+    return {
+        "normal": ("data/preprocessed_normal.frames", preprocess_data.pulse_params(frames, xc, yc, radius, 0.1), "normal"),
+        "antienergy": ("data/preprocessed_antienergy.frames", preprocess_data.pulse_params(frames, xc, yc, radius, 0.1), "no_energy"),
+        "exploding": ("data/preprocessed_exploding.frames", preprocess_data.explosion_params(frames, xc, yc, radius, 1, -0.1), "no_energy"),
+    }
+
+sequences = make_sequences(animation_frames)
+
+def generation_params(name, frames=animation_frames, resolution=(len(x), len(y))):
+    # Everything the frames of a sequence depend on, stored in the file header
+    path, (centers, alphas), scheme = make_sequences(frames)[name]
+    colormap = preprocess_data.colormaps[scheme]
+    params = {"grid": [x[0], x[-1], resolution[0], y[0], y[-1], resolution[1]], "amp": amp, "beta": beta,
+              "centers": centers.tolist(), "alphas": alphas.tolist(), "colors": colormap.stops, "lut_size": colormap.size}
+    return json.loads(json.dumps(params))
+
+def fit_to_window(width, height):
+    # Rect of the star image scaled to fit the window, centered
+    scale_factor = min(width / X.shape[1], height / X.shape[0])
+    img_rect = pygame.Rect(0, 0, int(X.shape[1] * scale_factor), int(X.shape[0] * scale_factor))
+    img_rect.center = (width / 2, height / 2)
+    return img_rect
+
+def load_data(name, size):
+    surface_data, params = open_frames(sequences[name][0])
+    if params != generation_params(name):
+        print(f"Warning: {sequences[name][0]} was generated with different parameters, pre-process again to update it")
+    # Surfaces are made from the frame file while the animation plays and
+    # kept at display size, so every frame is only scaled once per window size
+    return FrameProvider(surface_data, prefetch=prefetch_frames, size=size, keep=True)
+
+def release_finished(providers, sequence):
+    # Sequences play in order and never come back, the frames of the ones before sequence are freed
+    names = list(sequences)
+    for name in names[:names.index(sequence)]:
+        providers[name].release()
+
+def expect_jump(providers, animation):
+    # Decodes ahead where the animation can jump to: the energy button switches to
+    # antienergy at the current frame, the explosion starts at its first frame.
+    # Only while the playing sequence is ahead, so the two don't compete for the CPU.
+    if animation.sequence == "normal" and providers["normal"].idle:
+        providers["antienergy"].expect(animation.frame)
+    elif animation.sequence == "antienergy" and animation.frame >= animation.frames - prefetch_frames:
+        providers["exploding"].expect(0)
+
+def realtime_data(name, size):
+    # Frames computed at display size while the animation plays, no data files needed
+    path, (centers, alphas), scheme = sequences[name]
+    return RealtimeProvider((x[0], x[-1], y[0], y[-1]), centers, alphas, beta,
+                            preprocess_data.colormaps[scheme], size)
+
+class Animation:
+
+    '''
+    Which frame of which sequence is shown: the star pulses until its energy
+    is removed, finishes the pulse without energy, explodes and stays white
+    frames - frames of every sequence
+    '''
+
+    def __init__(self, frames=animation_frames):
+        self.frames = frames
+        self.sequence = "normal"
+        self.frame = 0
+        self.run_animation = True
+        self.run_explosion = False
+        self.return_to_beginning_state = False
+        self.reached_explosion_end = False
+
+    def remove_energy(self):
+        # Change star color, the explosion starts once the pulse is back at the beginning
+        self.sequence = "exploding" if self.run_explosion else "antienergy"
+        self.return_to_beginning_state = True
+
+    def advance(self):
+        if not self.run_animation:
+            return
+        if self.frame < self.frames - 1:
+            self.frame += 1
+            return
+        if self.return_to_beginning_state:
+            self.return_to_beginning_state = False
+            self.run_explosion = True
+            # Activate shake
+            self.sequence = "exploding"
+        elif self.run_explosion:
+            self.reached_explosion_end = True
+            self.run_animation = False
+            return
+        self.frame = 0
+
+def draw_frame(screen, animation, providers, img_rect, energy_button, timings=disabled):
+    # Star image of the current frame, white once the star has exploded, and the button
+    if animation.reached_explosion_end:
+        surface = pygame.Surface(img_rect.size)
         surface.fill((255, 255, 255))
-    
-    # Blit the surface onto the screen
+    else:
+        # Already at display size, only blitted
+        surface = providers[animation.sequence][animation.frame]
+    timings.mark("surface")
     screen.blit(surface, img_rect)
-    
-    # Draw button
-    energy_button.draw(screen)
-
-    pygame.display.flip()
-    clock.tick(30)  # Increase the speed to 60 FPS
-
-    if run_animation:
-        if frame < animation_frames - 1:
-                frame += 1
-        else:
-            if return_to_beginning_state:
-                return_to_beginning_state = False
-                run_explosion = True
-            elif run_explosion:
-                reached_explosion_end = True
-                run_animation = False
-                continue
-            frame = 0
-
-pygame.quit()
\ No newline at end of file
+    timings.mark("blit")
+    if energy_button:
+        energy_button.draw(screen)
+    timings.mark("button")
+
+def main():
+    parser = argparse.ArgumentParser(description="Visualise a star explosion")
+    parser.add_argument("--realtime", action="store_true",
+                        help="compute every frame on the fly instead of pre-processing, falls back to the data files when too slow")
+    parser.add_argument("--fps", type=int, default=None, help="target frame rate (default 30, 60 with --realtime)")
+    parser.add_argument("--timings", action="store_true", help="show FPS and frame times of every phase of the loop")
+    parser.add_argument("--timings-file", help="write the frame times of every phase to this JSON file on exit")
+    args = parser.parse_args()
+    fps = args.fps or (60 if args.realtime else 30)
+
+    input_data = "realtime" if args.realtime else -1
+    if not args.realtime:
+        print("Re-process or load data? 0 -> Pre-process, 1 -> Load (Type 0 if this is your first time running this file.)")
+    while input_data not in ("0", "1", "realtime"):
+        input_data = input()
+
+    if input_data == "0":
+        # Frames of all sequences are rendered in parallel, straight into the data files
+        print("Data preprocessing...")
+        render_sequences({name: (sequences[name][0], generation_params(name)) for name in sequences},
+                         keyframes=keyframe_sequences)
+
+    # Set up Pygame window
+    width, height = 800, 800
+
+    # Scale the image to fit the entire screen
+    img_rect = fit_to_window(width, height)
+
+    # Initialize Pygame
+    pygame.init()
+
+    screen = pygame.display.set_mode((width, height), pygame.RESIZABLE)
+    pygame.display.set_caption('Moffat Star')
+    clock = pygame.time.Clock()
+
+    # The window is open before any frame is decoded
+    if args.realtime:
+        providers = {name: realtime_data(name, img_rect.size) for name in sequences}
+    else:
+        print("Loading data...")
+        providers = {name: load_data(name, img_rect.size) for name in sequences}
+
+    #Energy button
+    energy_button = Button(width / 2 - 150, height - 100, 300, 50, "Remove all energy", (121, 32, 35))
+
+    # Instrumentation is opt-in, the stand-in does nothing
+    timings = Timings() if args.timings or args.timings_file else disabled
+    overlay = Overlay(timings) if args.timings else None
+
+    running = True
+    animation = Animation()
+    playing = animation.sequence
+    slow_frames = 0
+    frames_shown = 0
+    start_time = time.perf_counter()
+
+    while running:
+        timings.start()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.VIDEORESIZE:
+                width, height = event.w, event.h
+                screen.fill((0, 0, 0))
+                img_rect = fit_to_window(width, height)
+                energy_button.rect.topleft = (width / 2 - 150, height - 100)
+                for provider in providers.values():
+                    provider.resize(img_rect.size)
+            elif event.type == pygame.MOUSEMOTION:
+                energy_button.check_hover(pygame.mouse.get_pos())
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if energy_button.check_click(pygame.mouse.get_pos()):
+                    animation.remove_energy()
+        timings.mark("events")
+
+        draw_frame(screen, animation, providers, img_rect, energy_button, timings)
+
+        if args.realtime and not animation.reached_explosion_end:
+            provider = providers[animation.sequence]
+            slow_frames = slow_frames + 1 if provider.frame_time > 1 / fps else 0
+            if slow_frames > fps:
+                # Over the frame budget for a whole second, use the preprocessed frames if there are any
+                args.realtime = False
+                if all(os.path.exists(sequences[name][0]) for name in sequences):
+                    print(f"Frames take {provider.frame_time * 1000:.1f} ms, switching to the preprocessed data")
+                    for provider in providers.values():
+                        provider.close()
+                    providers = {name: load_data(name, img_rect.size) for name in sequences}
+                    release_finished(providers, animation.sequence)
+                else:
+                    print(f"Frames take {provider.frame_time * 1000:.1f} ms, run with 0 -> Pre-process to create the data for a smoother animation")
+
+        if overlay:
+            overlay.draw(screen)
+            timings.mark("overlay")
+
+        pygame.display.flip()
+        timings.mark("flip")
+        frames_shown += 1
+        clock.tick(fps)
+        timings.mark("tick")
+        timings.end()
+        animation.advance()
+        expect_jump(providers, animation)
+        if animation.sequence != playing:
+            playing = animation.sequence
+            release_finished(providers, playing)
+
+    # Every scaled frame used to cost a pygame.transform.scale per displayed frame,
+    # runs shorter than the prefetched and kept frames save nothing
+    scaled = sum(provider.scaled for provider in providers.values())
+    if scaled:
+        scale_ms = sum(provider.scale_time for provider in providers.values()) / scaled * 1000
+        saved_ms = scale_ms * max(frames_shown - scaled, 0) / max(frames_shown, 1)
+        print(f"Pre-scaled frames: {scaled} scaled once ({scale_ms:.2f} ms each), "
+              f"saved about {saved_ms:.2f} ms per frame "
+              f"over {frames_shown} frames in {time.perf_counter() - start_time:.1f} s")
+    if args.timings_file:
+        timings.dump(args.timings_file)
+        print(f"Frame times written to {args.timings_file}")
+    for provider in providers.values():
+        provider.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
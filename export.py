@@ -0,0 +1,181 @@
+import os
+
+# No window is opened, pygame only draws into memory
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+import pygame
+from button import Button
+import draw
+
+'''
+Headless export of the star explosion
+
+The animation runs through the same state machine as draw.py (draw.Animation),
+the energy is removed at a fixed frame instead of by a click, so every export
+with the same arguments gives the same frames. Frames are computed at the
+output size and streamed to the writer one at a time, as fast as the CPU
+allows.
+
+    python export.py explosion.mp4 --size 1280x720
+    python export.py frames/star_%05d.png
+    python export.py - | ffmpeg -f rawvideo -pix_fmt rgb24 -s 800x800 -r 30 -i - out.webm
+'''
+
+class FFmpegWriter:
+
+    '''
+    Pipes rgb24 frames into an ffmpeg process that encodes them to path
+    '''
+
+    def __init__(self, path, size, fps, ffmpeg="ffmpeg", options="-pix_fmt yuv420p"):
+        command = [ffmpeg, "-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                   "-s", f"{size[0]}x{size[1]}", "-r", str(fps), "-i", "-", *shlex.split(options), path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, surface):
+        self.process.stdin.write(pygame.image.tobytes(surface, "RGB"))
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait():
+            raise RuntimeError(f"ffmpeg exited with status {self.process.returncode}")
+
+class PNGWriter:
+
+    '''
+    Saves every frame as a PNG, pattern is a printf pattern like frames/star_%05d.png
+    '''
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.index = 0
+        directory = os.path.dirname(pattern % 0)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, surface):
+        pygame.image.save(surface, self.pattern % self.index)
+        self.index += 1
+
+    def close(self):
+        pass
+
+class RawWriter:
+
+    '''
+    Writes rgb24 frames back to back to path, "-" for stdout
+    '''
+
+    def __init__(self, path):
+        self.stdout = path == "-"
+        self.file = sys.stdout.buffer if self.stdout else open(path, "wb")
+
+    def write(self, surface):
+        self.file.write(pygame.image.tobytes(surface, "RGB"))
+
+    def close(self):
+        self.file.flush()
+        if not self.stdout:
+            self.file.close()
+
+def export(writer, size, frames=None, energy_at=10, hold=1, realtime=True, button=False):
+
+    '''
+    Renders the animation into writer, returns the number of frames written
+    size - (width, height) of the video
+    frames - frames to write, None stops after hold frames of the white end
+    energy_at - frame at which the energy is removed, the star never explodes
+                without it, so frames is needed if it is negative
+    realtime - compute the frames at the output size, False scales the preprocessed data files
+    button - draw the "Remove all energy" button like the window does
+    '''
+
+    if frames is None and energy_at < 0:
+        raise ValueError("the energy is never removed, the export would not end, give the number of frames")
+    width, height = size
+    screen = pygame.Surface(size)
+    img_rect = draw.fit_to_window(width, height)
+    if realtime:
+        providers = {name: draw.realtime_data(name, img_rect.size) for name in draw.sequences}
+    else:
+        providers = {name: draw.load_data(name, img_rect.size) for name in draw.sequences}
+    energy_button = Button(width / 2 - 150, height - 100, 300, 50, "Remove all energy", (121, 32, 35)) if button else None
+    animation = draw.Animation(len(providers["normal"]))
+
+    written = 0
+    white = 0
+    playing = animation.sequence
+    try:
+        while frames is None or written < frames:
+            if written == energy_at:
+                animation.remove_energy()
+            if animation.reached_explosion_end:
+                if frames is None and white == hold:
+                    break
+                white += 1
+            screen.fill((0, 0, 0))
+            draw.draw_frame(screen, animation, providers, img_rect, energy_button)
+            writer.write(screen)
+            written += 1
+            animation.advance()
+            draw.expect_jump(providers, animation)
+            if animation.sequence != playing:
+                playing = animation.sequence
+                draw.release_finished(providers, playing)
+    finally:
+        for provider in providers.values():
+            provider.close()
+    return written
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the star explosion as a video or image sequence, without a display")
+    parser.add_argument("output", help="video file encoded by ffmpeg, a PNG pattern like frames/%%05d.png, "
+                                       "a .raw/.rgb file or - for rgb24 frames on stdout")
+    parser.add_argument("--size", type=parse_size, default=(800, 800), help="WIDTHxHEIGHT of the video (default 800x800)")
+    parser.add_argument("--frames", type=int, default=None, help="frames to export (default: until the star has exploded)")
+    parser.add_argument("--energy-at", type=int, default=10, help="frame at which the energy is removed")
+    parser.add_argument("--fps", type=int, default=30, help="frame rate written to the video")
+    parser.add_argument("--data", action="store_true", help="scale the preprocessed data files instead of computing the frames")
+    parser.add_argument("--button", action="store_true", help="draw the energy button")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg executable")
+    parser.add_argument("--ffmpeg-options", default="-pix_fmt yuv420p", help="output options passed to ffmpeg")
+    args = parser.parse_args()
+    if args.energy_at < 0:
+        parser.error("--energy-at has to be 0 or more")
+
+    if args.output == "-" or args.output.endswith((".raw", ".rgb")):
+        writer = RawWriter(args.output)
+        if args.output == "-":
+            # Messages must not end up in the video
+            sys.stdout = sys.stderr
+    elif "%" in args.output:
+        writer = PNGWriter(args.output)
+    else:
+        if shutil.which(args.ffmpeg) is None:
+            parser.error(f"{args.ffmpeg} not found, export a PNG sequence (frames/%05d.png) or raw video (.raw) instead")
+        writer = FFmpegWriter(args.output, args.size, args.fps, args.ffmpeg, args.ffmpeg_options)
+
+    pygame.init()
+    start = time.perf_counter()
+    try:
+        written = export(writer, args.size, args.frames, args.energy_at, realtime=not args.data, button=args.button)
+    finally:
+        writer.close()
+        pygame.quit()
+    elapsed = time.perf_counter() - start
+    print(f"Exported {written} frames in {elapsed:.1f} s ({written / elapsed:.1f} frames/s)")
+
+if __name__ == "__main__":
+    main()
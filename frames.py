@@ -0,0 +1,230 @@
+import threading
+import time
+import numpy as np
+import pygame
+from data.radial import RadialProfile
+
+class FrameProvider:
+
+    '''
+    Hands out the pygame Surfaces of one animation sequence just in time
+    source - (frames, W, H, 3) uint8 surface data, e.g. from framestore.open_frames
+    prefetch - number of frames a background thread keeps decoded ahead
+    size - display size the frames are scaled to while decoding (None keeps the source size)
+    keep - keep every decoded frame, so each one is scaled once per display size
+    With keep, frames the source stores as references to an earlier frame
+    (framestore.FrameSequence.reference) share its surface.
+    Without keep only the frames in [index, index + prefetch) of the last
+    requested index are held, a frame is dropped once it has been handed out,
+    so memory does not grow with the number of frames.
+    A frame is decoded by one thread at a time, a request for a frame the
+    worker is decoding waits for it instead of decoding it again.
+    '''
+
+    def __init__(self, source, prefetch=4, size=None, keep=False):
+        self.source = source
+        self.prefetch = prefetch
+        self.size = size
+        self.keep = keep
+        self.scale_time = 0.
+        self.scaled = 0
+        # Frames with the same pixels share one kept surface
+        reference = getattr(source, "reference", None) if keep else None
+        self._keys = [reference(i) if reference else i for i in range(len(source))]
+        self._ready = {}
+        self._decoding = set()
+        self._waiting = None
+        # Nothing is prefetched before the first request or expect()
+        self._next = None
+        self._generation = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self.source)
+
+    def __getitem__(self, index):
+        with self._cond:
+            self._next = (index + 1) % len(self)
+            index = self._keys[index]
+            surface = self._take(index)
+            while surface is None and index in self._decoding:
+                # The worker is on it already
+                self._waiting = index
+                self._cond.wait()
+                surface = self._take(index)
+            self._waiting = None
+            if not self.keep:
+                window = self._window()
+                for stale in [i for i in self._ready if i not in window]:
+                    del self._ready[stale]
+            generation = self._generation
+            if surface is None:
+                self._decoding.add(index)
+            self._cond.notify_all()
+        if surface is None:
+            # Not prefetched (first frame or a jump), decode it right away
+            surface = self.decode(index)
+            self._store(index, surface, generation)
+        return surface
+
+    def _take(self, index):
+        return self._ready.get(index) if self.keep else self._ready.pop(index, None)
+
+    def resize(self, size):
+
+        '''
+        Changes the display size, frames are scaled again as they are needed
+        '''
+
+        with self._cond:
+            if size == self.size:
+                return
+            self.size = size
+            self._generation += 1
+            self._ready.clear()
+            self._cond.notify_all()
+
+    def decode(self, index):
+        surface = pygame.surfarray.make_surface(self.source[index])
+        size = self.size
+        if size is not None and surface.get_size() != tuple(size):
+            start = time.perf_counter()
+            surface = pygame.transform.scale(surface, size)
+            # Both threads decode
+            with self._cond:
+                self.scale_time += time.perf_counter() - start
+                self.scaled += 1
+        return surface
+
+    def expect(self, index):
+        # The next request will probably be index, the worker prefetches from there
+        with self._cond:
+            self._next = index % len(self)
+            self._cond.notify_all()
+
+    @property
+    def idle(self):
+        # The prefetch window is decoded, the worker has nothing to do
+        with self._cond:
+            return not self._decoding and self._missing() is None
+
+    def wait(self):
+        # Blocks until every frame of the prefetch window is decoded
+        with self._cond:
+            while not self._closed and (self._missing() is not None or self._decoding):
+                self._cond.wait()
+
+    def release(self):
+        # Frees the frames and stops the worker without waiting for it
+        with self._cond:
+            self._closed = True
+            self._ready.clear()
+            self._cond.notify_all()
+
+    def close(self):
+        self.release()
+        self._thread.join()
+
+    def _window(self):
+        if self._next is None:
+            return []
+        return [(self._next + i) % len(self) for i in range(min(self.prefetch, len(self)))]
+
+    def _missing(self):
+        for index in self._window():
+            index = self._keys[index]
+            if index not in self._ready and index not in self._decoding:
+                return index
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._missing() is None:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                index = self._missing()
+                generation = self._generation
+                self._decoding.add(index)
+            self._store(index, self.decode(index), generation)
+
+    def _store(self, index, surface, generation):
+        # Frames decoded for an old display size or outside the window are dropped,
+        # unless __getitem__ is waiting for them
+        with self._cond:
+            self._decoding.discard(index)
+            if generation == self._generation and (self.keep or index == self._waiting or index in self._window()):
+                self._ready[index] = surface
+            self._cond.notify_all()
+
+class RealtimeProvider:
+
+    '''
+    Computes the frames of one animation sequence on the fly at display size
+    extent - (x0, x1, y0, y1) of the star image, as used by the preprocessed grid
+    centers, alphas - Moffat center and alpha of every frame
+    beta - Moffat beta
+    colormap - data.colormap.Colormap of the sequence
+    size - display size of the star image
+    frame_time holds the seconds the last frame took to compute.
+    Frames go through a data.radial.RadialProfile cached per center, so only
+    the radius table is evaluated and the colors are gathered per pixel.
+    '''
+
+    def __init__(self, extent, centers, alphas, beta, colormap, size):
+        self.extent = extent
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.alphas = np.asarray(alphas, dtype=np.float64)
+        self.beta = beta
+        self.colormap = colormap
+        self.frame_time = 0.
+        self.scale_time = 0.
+        self.scaled = 0
+        self.resize(size)
+
+    def __len__(self):
+        return len(self.alphas)
+
+    def resize(self, size):
+        self.size = tuple(size)
+        width, height = self.size
+        x0, x1, y0, y1 = self.extent
+        self._x = np.linspace(x0, x1, width)
+        self._y = np.linspace(y0, y1, height)
+        self._profiles = {}
+        self._rgb = np.empty((width, height, 3), dtype=np.uint8)
+        self._surface = pygame.Surface(self.size)
+
+    def profile(self, center):
+
+        '''
+        RadialProfile of the display grid around center
+        '''
+
+        key = tuple(center)
+        if key not in self._profiles:
+            self._profiles[key] = RadialProfile(self._x, self._y, center)
+        return self._profiles[key]
+
+    def __getitem__(self, index):
+        start = time.perf_counter()
+        self.profile(self.centers[index]).render(1, self.alphas[index], self.beta, self.colormap, out=self._rgb)
+        pygame.surfarray.blit_array(self._surface, self._rgb)
+
+        self.frame_time = time.perf_counter() - start
+        return self._surface
+
+    idle = True
+
+    def expect(self, index):
+        pass
+
+    def release(self):
+        self._profiles.clear()
+
+    def close(self):
+        self.release()
@@ -0,0 +1,126 @@
+import json
+import time
+import numpy as np
+import pygame
+
+class Timings:
+
+    '''
+    Wall time of every phase of the last frames, kept in ring buffers
+    size - frames kept per phase
+    A frame is timed with start(), then mark(phase) at the end of every
+    phase, the time since the previous mark is booked on that phase, and
+    end(), which books the whole frame on "frame".
+    '''
+
+    # Histogram bins of the dump, in ms
+    bins = [0, 1, 2, 4, 8, 16, 33, 50, 100, np.inf]
+
+    def __init__(self, size=600):
+        self.size = size
+        self.count = 0
+        self.phases = {}
+        self._start = self._last = time.perf_counter()
+
+    def start(self):
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self._record(phase, now - self._last)
+        self._last = now
+
+    def end(self):
+        self._record("frame", time.perf_counter() - self._start)
+        self.count += 1
+
+    def _record(self, phase, seconds):
+        if phase not in self.phases:
+            self.phases[phase] = np.full(self.size, np.nan)
+        self.phases[phase][self.count % self.size] = seconds
+
+    def samples(self, phase):
+        # Times of the phase in ms, over the frames in the ring buffer
+        values = self.phases.get(phase, np.empty(0))
+        return values[~np.isnan(values)] * 1000
+
+    def stats(self, phase):
+        values = self.samples(phase)
+        if not len(values):
+            return {"mean": 0., "p50": 0., "p99": 0., "max": 0.}
+        return {"mean": values.mean(), "p50": np.percentile(values, 50), "p99": np.percentile(values, 99), "max": values.max()}
+
+    def fps(self):
+        # Frames per second over the ring buffer
+        values = self.samples("frame")
+        return 1000 * len(values) / values.sum() if len(values) else 0.
+
+    def dump(self, path):
+
+        '''
+        Writes statistics, a histogram and the raw times of every phase to a JSON file
+        '''
+
+        report = {"frames": self.count, "fps": self.fps(), "bins_ms": [str(edge) for edge in self.bins], "phases": {}}
+        for phase in self.phases:
+            values = self.samples(phase)
+            report["phases"][phase] = {
+                **{key: float(value) for key, value in self.stats(phase).items()},
+                "histogram": np.histogram(values, bins=self.bins)[0].tolist(),
+                "ms": values.round(4).tolist(),
+            }
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+class NoTimings:
+
+    '''
+    Stands in for Timings when instrumentation is off, every call does nothing
+    '''
+
+    count = 0
+
+    def start(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def end(self):
+        pass
+
+disabled = NoTimings()
+
+class Overlay:
+
+    '''
+    FPS and frame time percentiles drawn in the top left corner
+    timings - Timings to show
+    interval - seconds between updates of the text, rendering it every frame would show up in the timings
+    '''
+
+    def __init__(self, timings, interval=0.5):
+        self.timings = timings
+        self.interval = interval
+        self.font = pygame.font.Font(None, 24)
+        self._lines = []
+        self._updated = 0.
+
+    def draw(self, screen):
+        now = time.perf_counter()
+        if now - self._updated > self.interval:
+            self._updated = now
+            self._lines = [self.font.render(text, True, (0, 255, 0), (0, 0, 0)) for text in self.text()]
+        y = 5
+        for line in self._lines:
+            screen.blit(line, (5, y))
+            y += line.get_height()
+
+    def text(self):
+        frame = self.timings.stats("frame")
+        lines = [f"{self.timings.fps():5.1f} FPS  p50 {frame['p50']:5.1f} ms  p99 {frame['p99']:5.1f} ms"]
+        for phase in self.timings.phases:
+            if phase != "frame":
+                stats = self.timings.stats(phase)
+                lines.append(f"{phase:>8}  p50 {stats['p50']:5.2f} ms  p99 {stats['p99']:5.2f} ms")
+        return lines
@@ -1,26 +1,104 @@
+import bisect
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
 import numpy as np
-import matplotlib.pyplot as plt
+
+#Conversion factors
+hc = 197.327                                # conversion factor in MeV fm (h bar * c)
+G = hc * 6.67259e-45                        # gravitational constant in MeV^-1 fm^3 kg^-1
+Ms = 1.1157467e60                           # the mass of the sun in MeV
+
+#Dormand - Prince 5(4) tableau
+DP_C = (1/5, 3/10, 4/5, 8/9, 1., 1.)
+DP_A = ((1/5,),
+        (3/40, 9/40),
+        (44/45, -56/15, 32/9),
+        (19372/6561, -25360/2187, 64448/6561, -212/729),
+        (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+        (35/384, 0., 500/1113, 125/192, -2187/6784, 11/84))
+DP_E = (71/57600, 0., -71/16695, 71/1920, -17253/339200, 22/525, -1/40)
+
+# Columns of the StarModel.sweep table and their types
+SWEEP_COLUMNS = {"rho_s": float, "mn": float, "flag": int, "mass": float, "radius": float, "converged": bool}
+
+@dataclass
+class StarSolution:
+    
+    '''
+    Result of StarModel.solve
+    r, m, p - dimensionless radius, mass and pressure profiles
+    mass - total mass in solar masses
+    radius - radius in km
+    converged - the surface was reached before the end of the grid
+    status - description of how the integration ended
+    '''
+    
+    rho_s: float
+    mn: float
+    flag: int
+    r: np.ndarray
+    m: np.ndarray
+    p: np.ndarray
+    mass: float
+    radius: float
+    converged: bool
+    status: str
 
 class StarModel:
-    def initial_n(self, rho_s, mn):
+    def __init__(self, backend="numpy", cache=None):
+        
+        '''
+        backend - "numpy" runs the Python/NumPy loops, "numba" runs the
+        compiled loops of model_jit and falls back to "numpy" if numba is missing
+        cache - optional cache.SolutionCache used by solve
+        '''
+        
+        if backend not in ("numpy", "numba"):
+            raise ValueError(f"Unknown backend {backend!r}, expected 'numpy' or 'numba'")
+        self._jit = None
+        if backend == "numba":
+            import model_jit
+            if model_jit.HAVE_NUMBA:
+                self._jit = model_jit
+            else:
+                warnings.warn("numba is not installed, using the numpy backend")
+                backend = "numpy"
+        self.backend = backend
+        self.cache = cache
+        
+        # State buffer returned by RK4Solver, reused on every step
+        self._y = np.zeros(2)
+        self.newton_iterations = 0
+
+    def initial_n(self, rho_s, mn, n0=1):
         
         '''
         The initial Density of a Neutron Star
+        rho_s and mn may be scalars or arrays (one Newton-Raphson per star)
+        n0 - starting guess, e.g. the density of a neighbouring star
+        The number of iterations is kept in self.newton_iterations
         '''
         
-        n = 1
+        if self._jit is not None and np.ndim(rho_s) == 0 and np.ndim(mn) == 0:
+            n, self.newton_iterations = self._jit.initial_n(float(rho_s), float(mn), float(n0))
+            return n
+        
+        n = n0
         err = 1
         tol = 1e-15
         count = 0
         
-        while err > tol:
+        while err > tol and count < 100:
             count += 1
             fn = 236*n**(2.54) + n * mn - rho_s
             dfn = 236*2.54*n**(1.54) +mn
             temp = n - fn / dfn
-            err = np.abs(n-temp)
+            err = np.max(np.abs(n-temp), initial=0)
             n = temp
         #print(f"Newton-Raphson Converged after {count} iterations")
+        self.newton_iterations = count
         return n
 
     def rho(self, p, rho_s, mn):
@@ -32,7 +110,8 @@ class StarModel:
         n - number density at given pressure
         '''
         
-        n = (p*rho_s/363.44)**(1/2.54)
+        # np.power gives NaN for a negative pressure, a Python float ** would be complex
+        n = np.power(p*rho_s/363.44, 1/2.54)
         return (236. * n**2.54 + n * mn)/rho_s
 
     def dp_dr(self, r, m, p, rho_s, mn, flag):
@@ -66,6 +145,40 @@ class StarModel:
         
         return self.rho(p, rho_s, mn)*r**2
 
+    def derivatives(self, r, m, p, rho_s, mn, flag):
+        
+        '''
+        Mass and pressure gradients evaluated together (dm/dr, dp/dr)
+        The EOS is evaluated once. Since n**2.54 = p*rho_s/363.44 only the
+        1/2.54 power of the pressure has to be computed.
+        '''
+        
+        x = p*rho_s/363.44
+        # NaN past the surface as in model_jit, also for Python floats (** would give a complex number)
+        rho = (236. * x + np.power(x, 1/2.54) * mn)/rho_s
+        
+        dm = rho*r**2
+        if flag == 0:
+            #Classical Model
+            dp = -m*rho/(r**2 + 1e-20)
+        else:
+            #Relativistic Model
+            dp = -(p+rho) * (m + p*r**3)/(r**2 - 2*m*r + 1e-20)
+        
+        return dm, dp
+
+    def units(self, rho_s):
+        
+        '''
+        Mass and length scales of the dimensionless equations
+        M0 - mass unit in MeV
+        R0 - length unit in fm * 1e18 (multiply by 1e-18 for km)
+        '''
+        
+        M0 = (4*3.14159265*(G**3)*rho_s)**(-0.5)
+        R0 = G*M0
+        return M0, R0
+
     def RK4Solver(self, r, m, p, h, rho_s, mn, flag):
         
         '''
@@ -73,34 +186,223 @@ class StarModel:
         Calculates 4 different pressure and mass gradients
         K1_ - Mass gradients
         K2_ - Pressure Gradients
+        The returned array is a buffer reused by the next call, unpack it right away
         '''
         
-        y = np.zeros(2)
+        y = self._y
+        y[0], y[1] = self.RK4Step(r, m, p, h, rho_s, mn, flag)
+        
+        return y
+
+    def RK4Step(self, r, m, p, h, rho_s, mn, flag):
+        
+        '''
+        Single RK4 step returning the updated (m, p)
+        m, p, rho_s and mn may be arrays, every star is advanced at once
+        '''
         
         #Gradient 1 at start point
-        k11 = self.dm_dr(r, m, p, rho_s, mn)
-        k21 = self.dp_dr(r, m, p, rho_s, mn, flag)
+        k11, k21 = self.derivatives(r, m, p, rho_s, mn, flag)
         
         #Gradient 2 at mid of start and end point
-        k12 = self.dm_dr(r + 0.5*h, m + 0.5*k11*h, p + 0.5*k21*h, rho_s, mn)
-        k22 = self.dp_dr(r + 0.5*h, m + 0.5*k11*h, p + 0.5*k21*h, rho_s, mn, flag)
+        k12, k22 = self.derivatives(r + 0.5*h, m + 0.5*k11*h, p + 0.5*k21*h, rho_s, mn, flag)
         
         #Gradient 3 at mid of start and end point
-        k13 = self.dm_dr(r + 0.5*h, m + 0.5*k12*h, p + 0.5*k22*h, rho_s, mn)
-        k23 = self.dp_dr(r + 0.5*h, m + 0.5*k12*h, p + 0.5*k22*h, rho_s, mn, flag)
+        k13, k23 = self.derivatives(r + 0.5*h, m + 0.5*k12*h, p + 0.5*k22*h, rho_s, mn, flag)
         
         #Gradient 4 at start point
-        k14 = self.dm_dr(r + h, m + k13*h, p + k23*h, rho_s, mn)
-        k24 = self.dp_dr(r + h, m + k13*h, p + k23*h, rho_s, mn, flag)
+        k14, k24 = self.derivatives(r + h, m + k13*h, p + k23*h, rho_s, mn, flag)
         
         #Update of m and p
-        y[0] = m + h*(k11 + 2*k12 + 2*k13 + k14)/6
-        y[1] = p + h*(k21 + 2*k22 + 2*k23 + k24)/6
+        m_new = m + h*(k11 + 2*k12 + 2*k13 + k14)/6
+        p_new = p + h*(k21 + 2*k22 + 2*k23 + k24)/6
         
-        return y
+        return m_new, p_new
+
+    def run_batch(self, rho_s, mass, flag=1, N=1501, r_max=15, tol=9e-5):
+        
+        '''
+        Integrates a whole set of stars at once (e.g. a mass-radius curve)
+        rho_s - array of central densities in MeV/fm^3
+        mass - mass of a neutron in MeV c^-2 (scalar or one per star)
+        Every star shares the radius grid of run_calculation. Stars whose
+        pressure dropped below tol are removed from the working arrays,
+        the rest keep being advanced with one array operation per RK4 stage.
+        A step past the surface can leave P negative and the EOS NaN, such a
+        star ends at its last finite point.
+        Returns arrays of central density, total mass in solar masses, radius in km
+        and converged, the stars that reached the surface within the grid. A star
+        whose first step already reaches the surface is not resolved and is not converged.
+        '''
+        
+        rho_s = np.atleast_1d(np.asarray(rho_s, dtype=float))
+        mn = np.broadcast_to(np.asarray(mass, dtype=float), rho_s.shape)
+        M0, R0 = self.units(rho_s)
+        
+        if self._jit is not None:
+            m_end, r_end, converged = self._jit.run_batch(rho_s, np.ascontiguousarray(mn), flag, N, r_max, tol)
+            return rho_s, m_end*M0/Ms, r_end*R0*1e-18, converged
+        if rho_s.size == 0:
+            return rho_s, np.zeros(0), np.zeros(0), np.zeros(0, dtype=bool)
+        
+        r = np.linspace(0, r_max, N)
+        h = r[1]-r[0]
+        
+        '''Central values of every star'''
+        ni = self.initial_n(rho_s, mn)
+        m_end = np.zeros(rho_s.shape)
+        r_end = np.full(rho_s.shape, r[-1])
+        
+        '''Working arrays holding only the stars which haven't reached the surface yet'''
+        ids = np.arange(rho_s.size)
+        m = np.zeros(rho_s.size)
+        p = 363.44 * (ni**2.54)/rho_s
+        rho_a = rho_s.copy()
+        mn_a = np.array(mn)
+        
+        converged = np.zeros(rho_s.shape, dtype=bool)
+        for i in range(0, N-1):
+            m_prev = m
+            m, p = self.RK4Step(r[i], m, p, h, rho_a, mn_a, flag)
+            # NaN pressure (overshot surface) counts as done too
+            done = ~(p >= tol)
+            if done.any():
+                finite = np.isfinite(m[done])
+                m_end[ids[done]] = np.where(finite, m[done], m_prev[done])
+                r_end[ids[done]] = np.where(finite, r[i+1], r[i])
+                converged[ids[done]] = i > 0
+                keep = ~done
+                ids, m, p, rho_a, mn_a = ids[keep], m[keep], p[keep], rho_a[keep], mn_a[keep]
+                if ids.size == 0:
+                    break
+        
+        '''Stars that never reached P < tol keep the values at the end of the grid'''
+        m_end[ids] = m
+        
+        return rho_s, m_end*M0/Ms, r_end*R0*1e-18, converged
+
+    def iter_sweep(self, rho_s, masses, flags=(1,), processes=None, chunksize=256, N=1501, r_max=15, tol=9e-5):
+
+        '''
+        Runs run_batch over the grid rho_s x masses x flags on a process pool
+        Chunks of at most chunksize stars are sent to the workers and yielded
+        as soon as they finish (in completion order) as a dict of columns
+        rho_s, mn, flag, mass, radius, converged plus "index", the position in the grid.
+        converged is False for stars that did not reach the surface within r_max.
+        processes - number of worker processes, None for all cores, 1 runs in this process
+        '''
+
+        rho_g, mn_g, flag_g = (g.ravel() for g in np.meshgrid(np.asarray(rho_s, dtype=float),
+                                                               np.asarray(masses, dtype=float),
+                                                               np.asarray(flags, dtype=int), indexing="ij"))
+        if processes is None:
+            processes = os.cpu_count() or 1
+
+        '''Small grids are split finer so every worker gets a few chunks'''
+        chunksize = max(1, min(chunksize, -(-rho_g.size // (4*processes))))
+        tasks = []
+        for flag in np.unique(flag_g):
+            index = np.flatnonzero(flag_g == flag)
+            for start in range(0, index.size, chunksize):
+                chunk = index[start:start+chunksize]
+                tasks.append((self.backend, chunk, rho_g[chunk], mn_g[chunk], int(flag), N, r_max, tol))
+
+        if processes == 1:
+            for task in tasks:
+                yield _sweep_chunk(*task)
+            return
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_sweep_chunk, *task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def sweep(self, rho_s, masses, flags=(1,), output=None, processes=None, chunksize=256, N=1501, r_max=15, tol=9e-5):
+
+        '''
+        Collects iter_sweep into one table of columns ordered like the grid
+        output - optional .npz, .csv or .parquet file the table is written to
+        Returns the table as a dict of NumPy arrays, empty for an empty grid
+        '''
+
+        size = np.size(rho_s) * np.size(masses) * np.size(flags)
+        table = {key: np.empty(size, dtype=dtype) for key, dtype in SWEEP_COLUMNS.items()}
+        for chunk in self.iter_sweep(rho_s, masses, flags, processes, chunksize, N, r_max, tol):
+            for key in SWEEP_COLUMNS:
+                table[key][chunk["index"]] = chunk[key]
+
+        if output is not None:
+            write_table(output, table)
+        return table
+
+    def trace_mass_radius(self, mass, rho_min=200., rho_max=5000., flag=1, samples=9, mass_tol=1e-4,
+                          bend=0.1, max_stars=400, **options):
+
+        '''
+        Mass-radius curve by continuation in the central density
+        Every star is integrated with integrate_adaptive, warm started from
+        its nearest solved neighbour (initial_n guess and first step size).
+        Starting from `samples` log-spaced densities, intervals are bisected
+        where the curve turns by more than `bend` radians (in M/M_max, R/R_max)
+        and around the maximum mass until its neighbours are within mass_tol.
+        Returns a dict of arrays rho_s, mass, radius (sorted by density) and
+        max_mass, rho_max_mass and stars, the number of stars solved
+        '''
+
+        log_rho = []
+        stars = []
+
+        def solve_at(x):
+
+            '''Solves the star at log density x, warm started from its neighbour'''
+
+            j = bisect.bisect_left(log_rho, x)
+            warm = {}
+            if stars:
+                near = min((k for k in (j-1, j) if 0 <= k < len(stars)), key=lambda k: abs(log_rho[k]-x))
+                warm = {"n0": stars[near]["n"], "h0": stars[near]["h0"]}
+            rho_s = np.exp(x)
+            r, m, p, lbl1 = self.integrate_adaptive(rho_s, mass, flag, **{**options, **warm})
+            M0, R0 = self.units(rho_s)
+            log_rho.insert(j, x)
+            stars.insert(j, {"mass": m[-1]*M0/Ms, "radius": r[-1]*R0*1e-18,
+                             "n": (p[0]*rho_s/363.44)**(1/2.54), "h0": r[1]-r[0]})
+
+        for x in np.linspace(np.log(rho_min), np.log(rho_max), samples):
+            solve_at(x)
+
+        while len(stars) < max_stars:
+            M = np.array([s["mass"] for s in stars])
+            R = np.array([s["radius"] for s in stars])
+            split = set()
+
+            '''Turning angle of the curve at every interior point'''
+            dM, dR = np.diff(M)/M.max(), np.diff(R)/R.max()
+            angle = np.abs(np.angle(np.exp(1j*(np.arctan2(dM[1:], dR[1:]) - np.arctan2(dM[:-1], dR[:-1])))))
+            for k in np.flatnonzero(angle > bend):
+                split.update((k, k+1))
+
+            '''Maximum mass: bisect both sides until the neighbours are within mass_tol'''
+            k = int(np.argmax(M))
+            if 0 < k < len(M)-1 and M[k] - min(M[k-1], M[k+1]) > mass_tol:
+                split.update((k-1, k))
+
+            split = [k for k in sorted(split) if log_rho[k+1] - log_rho[k] > 1e-9]
+            if not split:
+                break
+            for x in [0.5*(log_rho[k] + log_rho[k+1]) for k in split][:max_stars - len(stars)]:
+                solve_at(x)
+
+        M = np.array([s["mass"] for s in stars])
+        k = int(np.argmax(M))
+        return {"rho_s": np.exp(log_rho), "mass": M, "radius": np.array([s["radius"] for s in stars]),
+                "max_mass": M[k], "rho_max_mass": np.exp(log_rho[k]), "stars": len(stars)}
 
     def plot_data(self, color, label, r, R0, m, M0, Ms):
         
+        # Imported here so the computation never loads matplotlib
+        import matplotlib.pyplot as plt
+        
         #Mass profile
         plt.subplot(1, 2, 1)
         plt.plot(r*R0*1e-18, m*M0/Ms, color = color, linewidth = 1.2, label = label)
@@ -121,23 +423,39 @@ class StarModel:
         plt.ylim(bottom = 0)
         plt.legend(fontsize = 13, frameon = False)
         
-    def run_calculation(self, mass):
-        
-        #Simulation parameters and Conversion factors
-        hc = 197.327                                # conversion factor in MeV fm (h bar * c)
-        G = hc * 6.67259e-45                        # gravitational constant in MeV^-1 fm^3 kg^-1
-        Ms = 1.1157467e60                           # the mass of the sun in MeV
-        rho_s = 1665.3                              # central density of a neutron star (density at r = 0) in MeV/fm^3
-        M0 = (4*3.14159265*(G**3)*rho_s)**(-0.5)
-        R0 = G*M0
-        mn = mass                              # the mass of a neutron in MeV c^-2
+    def RK45Solver(self, r, m, p, h, rho_s, mn, flag, k1=None):
+
+        '''
+        Dormand - Prince embedded Runge - Kutta 5(4) Method
+        Returns the 5th order (m, p), the difference to the 4th order
+        solution used as error estimate and the gradients at the new point
+        k1 - gradients at (r, m, p), reused from the previous accepted step
+        '''
+
+        if k1 is None:
+            k1 = self.derivatives(r, m, p, rho_s, mn, flag)
+        k = [k1]
+        for c, a in zip(DP_C, DP_A):
+            mi = m + h*sum(aj*kj[0] for aj, kj in zip(a, k))
+            pi = p + h*sum(aj*kj[1] for aj, kj in zip(a, k))
+            k.append(self.derivatives(r + c*h, mi, pi, rho_s, mn, flag))
 
-        #Initialising values and array
-        '''Theese are the values for the radius, the step size and the tolerance value'''
-        N = 1501                            # Total number of data points
-        r = np.linspace(0,15,N)             # values of radius to compute enclosed mass within it
+        '''The last stage is evaluated at the 5th order solution (FSAL)'''
+        err_m = h*sum(e*kj[0] for e, kj in zip(DP_E, k))
+        err_p = h*sum(e*kj[1] for e, kj in zip(DP_E, k))
+
+        return mi, pi, err_m, err_p, k[-1]
+
+    def integrate_rk4(self, rho_s, mn, flag, N=1501, r_max=15, tol=9e-5):
+
+        '''
+        Fixed step RK4 on N points between r = 0 and r_max
+        Stops at the first point where P < tol
+        Returns the radius, mass and pressure profiles and a status label
+        '''
+
+        r = np.linspace(0, r_max, N)        # values of radius to compute enclosed mass within it
         h = r[1]-r[0]                       # step size for RK4Solver
-        tol = 9e-5                          # tolerance for RK4Solver
 
         '''Arrays to store the updation values in RK4Solver'''
         m = np.zeros(N)                     # mass
@@ -151,54 +469,195 @@ class StarModel:
         m[0] = 0
         p[0] = 363.44 * (ni**2.54)/rho_s
 
-        '''Setting flags for choosing between classical and relativistic model'''
-        flag_set = [0,1]
+        if self._jit is not None:
+            i = self._jit.integrate_rk4(r, m, p, float(rho_s), float(mn), flag, tol)
+        else:
+            for i in range(0, N-1):
+                [m[i+1], p[i+1]] = self.RK4Solver(r[i], m[i], p[i], h, rho_s, mn, flag)
+                # A NaN pressure means the step overshot the surface
+                if not p[i+1] >= tol:
+                    break
 
-        '''Printing initial values'''
-        """print("Initial number density, ni =", ni)
-        print("Initial pressure, P[0] =", p[0]*rho_s, "MeV/fm^3")
-        print("Simulation range, R = 0 to R =", r[-1]*R0*1e-18, "km")
-        print("Step size for RK4 Solver:", h)"""
+        '''Keep only the used indices of array, up to the last finite point'''
+        end = i+2 if np.isfinite(m[i+1]) and np.isfinite(p[i+1]) else i+1
+        if p[i+1] >= tol:
+            lbl1 = "Program didn't converge to P = 0, extend the maximum value of r"
+        elif i == 0:
+            lbl1 = "Program didn't resolve the star, its first step already reached the surface, increase N"
+        elif end == i+1:
+            lbl1 = f"P < {tol} found after {i} runs, the last step overshot the surface and was dropped"
+        else:
+            lbl1 = f"P < {tol} found after {i} runs"
+        return r[:end], m[:end], p[:end], lbl1
 
+    def integrate_adaptive(self, rho_s, mn, flag, rtol=1e-8, atol=1e-12, h0=1e-3, max_steps=100000, n0=1):
 
-        '''Using the RK4 Numerical Method for modeling a neutron star'''
-        plt.figure(figsize= (18, 5))
-        flag = flag_set[1]
-        for i in range(0, N-1):
-            if flag == 0:
-                [m[i+1], p[i+1]] = self.RK4Solver(r[i], m[i], p[i], h, rho_s, mn, flag)
-            else:
-                [m[i+1], p[i+1]] = self.RK4Solver(r[i], m[i], p[i], h, rho_s, mn, flag)
-            if p[i+1] < tol:
+        '''
+        Adaptive step RK45 from r = 0 until the surface P = 0
+        Steps grow in the smooth interior and shrink near the surface.
+        Close to the surface P^(1-1/2.54) falls linearly with r (polytropic
+        EOS), which is used to locate the P = 0 event.
+        h0 - first trial step, n0 - starting guess of initial_n
+        Returns the radius, mass and pressure profiles and a status label
+        '''
+
+        gamma = 1 - 1/2.54
+
+        ni = self.initial_n(rho_s, mn, n0)
+        r_i, m_i, p_i = 0., 0., 363.44 * (ni**2.54)/rho_s
+        r, m, p = [r_i], [m_i], [p_i]
+
+        h = h0
+        k1 = None
+        evaluations = 0
+        lbl1 = f"Program didn't reach P = 0 within {max_steps} steps"
+
+        for i in range(max_steps):
+            if k1 is None:
+                k1 = self.derivatives(r_i, m_i, p_i, rho_s, mn, flag)
+                evaluations += 1
+
+            '''Distance to the surface, extrapolated linearly in P^gamma'''
+            dist = -gamma * p_i / k1[1] if k1[1] < 0 else np.inf
+            if dist < 1e-10 * max(r_i, 1.):
+                r_i, m_i, p_i = r_i + dist, m_i + k1[0]*dist, 0.
+                r.append(r_i)
+                m.append(m_i)
+                p.append(p_i)
+                lbl1 = f"P = 0 found after {i} steps, {evaluations} derivative evaluations"
                 break
-        #print()
-        if i == N-2:
-            lbl1 = "Program didn't converge to P = 0, extend the maximum value of r"
+            h = min(h, 0.9*dist)
+
+            m_new, p_new, err_m, err_p, k_new = self.RK45Solver(r_i, m_i, p_i, h, rho_s, mn, flag, k1)
+            evaluations += 6
+            if not (np.isfinite(p_new) and p_new > 0):
+                '''Stepped past the surface'''
+                h *= 0.25
+                continue
+
+            err = max(abs(err_m)/(atol + rtol*abs(m_new)), abs(err_p)/(atol + rtol*abs(p_new)))
+            if err <= 1:
+                r_i, m_i, p_i = r_i + h, m_new, p_new
+                r.append(r_i)
+                m.append(m_i)
+                p.append(p_i)
+                k1 = k_new
+            h *= min(5., max(0.2, 0.9*err**(-0.2))) if err > 0 else 5.
+
+        return np.array(r), np.array(m), np.array(p), lbl1
+
+    def solve(self, mass, rho_s=1665.3, flag=1, solver="rk4", **options):
+
+        '''
+        Pure computation of one star, nothing is plotted
+        mass - mass of a neutron in MeV c^-2
+        rho_s - central density in MeV/fm^3
+        flag - 0 for the classical, 1 for the relativistic model
+        solver - "rk4" for the fixed grid, "rk45" for the adaptive integrator
+        options - passed on to integrate_rk4 / integrate_adaptive
+        Returns a StarSolution with the profiles and the summary
+        '''
+
+        if self.cache is not None:
+            key = self.cache.key(solver, rho_s, mass, flag, options)
+            solution = self.cache.get(key)
+            if solution is None:
+                solution = self._solve(mass, rho_s, flag, solver, **options)
+                self.cache.put(key, solution)
+            return solution
+        return self._solve(mass, rho_s, flag, solver, **options)
+
+    def _solve(self, mass, rho_s, flag, solver, **options):
+        if solver == "rk4":
+            r, m, p, lbl1 = self.integrate_rk4(rho_s, mass, flag, **options)
+        elif solver == "rk45":
+            r, m, p, lbl1 = self.integrate_adaptive(rho_s, mass, flag, **options)
         else:
-            lbl1 = f"P < {tol} found after {i} runs"
-            
-        '''Keep only the used indices of array and discard the remaining ones'''
-        m = m[:i+2]
-        p = p[:i+2]
-        r = r[:i+2]
-        
-        '''Visualise and print the results'''
-        if flag == 0:
-            lbl = "Classical Model"
-            self.plot_data('tab:orange', "Classical Model", r, R0, m, M0, Ms)
+            raise ValueError(f"Unknown solver {solver!r}, expected 'rk4' or 'rk45'")
+
+        M0, R0 = self.units(rho_s)
+        return StarSolution(rho_s=rho_s, mn=mass, flag=flag, r=r, m=m, p=p,
+                            mass=m[-1]*M0/Ms, radius=r[-1]*R0*1e-18,
+                            converged=not lbl1.startswith("Program didn't"), status=lbl1)
+
+    def plot_solution(self, solution):
+
+        '''
+        Plots the profiles of a StarSolution in a new figure
+        '''
+
+        import matplotlib.pyplot as plt
+
+        M0, R0 = self.units(solution.rho_s)
+        plt.figure(figsize= (18, 5))
+        if solution.flag == 0:
+            self.plot_data('tab:orange', "Classical Model", solution.r, R0, solution.m, M0, Ms)
         else:
-            lbl = "Relativistic Model"
-            self.plot_data('tab:cyan', "Relativistic Model", r, R0, m, M0, Ms)
-            
+            self.plot_data('tab:cyan', "Relativistic Model", solution.r, R0, solution.m, M0, Ms)
+        plt.subplots_adjust(wspace=0.15)
+
+    def run_calculation(self, mass, solver="rk4", plot=False):
+
+        '''
+        mass - mass of a neutron in MeV c^-2
+        solver - "rk4" for the fixed grid, "rk45" for the adaptive integrator
+        plot - draw the mass profile with matplotlib
+        '''
+
+        #Simulation parameters
+        rho_s = 1665.3                              # central density of a neutron star (density at r = 0) in MeV/fm^3
+
+        '''Setting flags for choosing between classical and relativistic model'''
+        flag_set = [0,1]
+
+        '''Using the RK4 Numerical Method for modeling a neutron star'''
+        flag = flag_set[1]
+        solution = self.solve(mass, rho_s, flag, solver)
+
+        '''Visualise and print the results'''
+        if plot:
+            self.plot_solution(solution)
+
         '''Printing the overall output'''
         """print("=============================================================================")
-        print(lbl, "Results:", lbl1)
+        print("Relativistic Model" if flag else "Classical Model", "Results:", solution.status)
         print("=============================================================================")
         print("Initial density, rho_s =", rho_s, "MeV/fm^3")
-        print("Total mass =", m[-1]*M0/Ms, "times Solar mass")
-        print("Radius of the Neutron Star =", r[-1]*R0*1e-18, "km")"""
-            
-        #print()
-        plt.subplots_adjust(wspace=0.15)
-        
-        return rho_s, m[-1]*M0/Ms, r[-1]*R0*1e-18
\ No newline at end of file
+        print("Total mass =", solution.mass, "times Solar mass")
+        print("Radius of the Neutron Star =", solution.radius, "km")"""
+
+        return rho_s, solution.mass, solution.radius
+
+def _sweep_chunk(backend, index, rho_s, mn, flag, N, r_max, tol):
+
+    '''
+    Worker of StarModel.iter_sweep, one run_batch call per chunk
+    '''
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        rho_s, mass, radius, converged = StarModel(backend).run_batch(rho_s, mn, flag, N, r_max, tol)
+    return {"index": index, "rho_s": rho_s, "mn": mn, "flag": np.full(index.size, flag),
+            "mass": mass, "radius": radius, "converged": converged}
+
+def write_table(path, table):
+
+    '''
+    Writes a dict of equally long columns as .npz, .csv or .parquet
+    '''
+
+    path = str(path)
+    if path.endswith(".npz"):
+        np.savez(path, **table)
+    elif path.endswith(".csv"):
+        # Integer and bool columns as whole numbers, the rest at full precision
+        types = [SWEEP_COLUMNS.get(key, np.asarray(table[key]).dtype.type) for key in table]
+        fmt = ["%d" if np.issubdtype(kind, np.integer) or np.issubdtype(kind, np.bool_) else "%.18e" for kind in types]
+        np.savetxt(path, np.column_stack([table[key] for key in table]), delimiter=",", fmt=fmt,
+                   header=",".join(table), comments="")
+    elif path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table(table), path)
+    else:
+        raise ValueError(f"Unsupported table format {path!r}, use .npz, .csv or .parquet")
\ No newline at end of file
@@ -0,0 +1,107 @@
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        # Without numba the kernels stay plain Python functions
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+'''
+Compiled counterparts of the StarModel hot loops, used by StarModel(backend="numba")
+They follow model.py operation by operation so both backends agree up to rounding.
+'''
+
+@njit(cache=True)
+def initial_n(rho_s, mn, n0):
+
+    '''
+    Newton-Raphson for the initial number density of a single star
+    Returns the density and the number of iterations
+    '''
+
+    n = n0
+    err = 1.
+    count = 0
+    while err > 1e-15 and count < 100:
+        count += 1
+        fn = 236*n**2.54 + n * mn - rho_s
+        dfn = 236*2.54*n**1.54 + mn
+        temp = n - fn / dfn
+        err = abs(n-temp)
+        n = temp
+    return n, count
+
+@njit(cache=True)
+def derivatives(r, m, p, rho_s, mn, flag):
+
+    '''
+    Fused (dm/dr, dp/dr), see StarModel.derivatives
+    '''
+
+    x = p*rho_s/363.44
+    if x < 0:
+        rho = np.nan
+    else:
+        rho = (236. * x + x**(1/2.54) * mn)/rho_s
+    dm = rho*r**2
+    if flag == 0:
+        dp = -m*rho/(r**2 + 1e-20)
+    else:
+        dp = -(p+rho) * (m + p*r**3)/(r**2 - 2*m*r + 1e-20)
+    return dm, dp
+
+@njit(cache=True)
+def integrate_rk4(r, m, p, rho_s, mn, flag, tol):
+
+    '''
+    Fixed step RK4 over the grid r, filling m and p in place
+    m[0] and p[0] hold the central values
+    Returns the index i of the last step taken (as in StarModel.integrate_rk4)
+    '''
+
+    h = r[1]-r[0]
+    i = 0
+    for i in range(0, r.shape[0]-1):
+        k11, k21 = derivatives(r[i], m[i], p[i], rho_s, mn, flag)
+        k12, k22 = derivatives(r[i] + 0.5*h, m[i] + 0.5*k11*h, p[i] + 0.5*k21*h, rho_s, mn, flag)
+        k13, k23 = derivatives(r[i] + 0.5*h, m[i] + 0.5*k12*h, p[i] + 0.5*k22*h, rho_s, mn, flag)
+        k14, k24 = derivatives(r[i] + h, m[i] + k13*h, p[i] + k23*h, rho_s, mn, flag)
+        m[i+1] = m[i] + h*(k11 + 2*k12 + 2*k13 + k14)/6
+        p[i+1] = p[i] + h*(k21 + 2*k22 + 2*k23 + k24)/6
+        # A NaN pressure means the step overshot the surface
+        if not p[i+1] >= tol:
+            break
+    return i
+
+@njit(cache=True)
+def run_batch(rho_s, mn, flag, N, r_max, tol):
+
+    '''
+    Integrates every star to its surface
+    Returns the dimensionless total mass and radius of each star, at its
+    last finite point, and whether it reached the surface within the grid
+    '''
+
+    r = np.linspace(0, r_max, N)
+    m = np.zeros(N)
+    p = np.zeros(N)
+    m_end = np.zeros(rho_s.shape[0])
+    r_end = np.zeros(rho_s.shape[0])
+    converged = np.zeros(rho_s.shape[0], dtype=np.bool_)
+    for j in range(rho_s.shape[0]):
+        ni, count = initial_n(rho_s[j], mn[j], 1.)
+        m[0] = 0.
+        p[0] = 363.44 * (ni**2.54)/rho_s[j]
+        i = integrate_rk4(r, m, p, rho_s[j], mn[j], flag, tol)
+        end = i+1 if np.isfinite(m[i+1]) and np.isfinite(p[i+1]) else i
+        m_end[j] = m[end]
+        r_end[j] = r[end]
+        # A surface reached by the first step is not resolved
+        converged[j] = not p[i+1] >= tol and i > 0
+    return m_end, r_end, converged
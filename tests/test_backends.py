@@ -0,0 +1,63 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model import Ms, StarModel
+
+pytest.importorskip("numba")
+
+# The EOS warns when a step overshoots the surface, which these stars do
+pytestmark = pytest.mark.filterwarnings("ignore::RuntimeWarning")
+
+mn = 939.565
+# A few stars over the usual range, 546.29... overshoots the surface in its last step
+densities = [200., 546.29258517, 1665.3, 5000.]
+
+@pytest.fixture(scope="module")
+def models():
+    return StarModel("numpy"), StarModel("numba")
+
+@pytest.mark.parametrize("flag", [0, 1])
+@pytest.mark.parametrize("rho_s", densities)
+def test_integrate_rk4(models, rho_s, flag):
+    (r1, m1, p1, lbl1), (r2, m2, p2, lbl2) = (model.integrate_rk4(rho_s, mn, flag) for model in models)
+    assert lbl1 == lbl2
+    assert np.array_equal(r1, r2)
+    assert np.all(np.isfinite(m1)) and np.all(np.isfinite(p1))
+    np.testing.assert_allclose(m2, m1, rtol=1e-10, atol=1e-14)
+    np.testing.assert_allclose(p2, p1, rtol=1e-10, atol=1e-14)
+
+@pytest.mark.parametrize("flag", [0, 1])
+def test_run_batch(models, flag):
+    (rho1, mass1, radius1, converged1), (rho2, mass2, radius2, converged2) = (
+        model.run_batch(densities, mn, flag) for model in models)
+    assert np.array_equal(rho1, rho2)
+    assert np.array_equal(radius1, radius2)
+    assert np.all(np.isfinite(mass1))
+    np.testing.assert_allclose(mass2, mass1, rtol=1e-10)
+    assert np.array_equal(converged1, converged2)
+
+def test_run_batch_matches_integrate_rk4(models):
+    # The batch ends every star where the single star integration does
+    model = models[0]
+    rho_s, mass, radius, converged = model.run_batch(densities, mn, 1)
+    for j, rho in enumerate(densities):
+        r, m, p, lbl1 = model.integrate_rk4(rho, mn, 1)
+        M0, R0 = model.units(rho)
+        assert radius[j] == pytest.approx(r[-1]*R0*1e-18)
+        assert mass[j] == pytest.approx(m[-1]*M0/Ms)
+
+def test_run_batch_empty(models):
+    for model in models:
+        rho_s, mass, radius, converged = model.run_batch([], mn)
+        assert rho_s.size == mass.size == radius.size == converged.size == 0
+
+@pytest.mark.parametrize("N", [3, 10])
+def test_first_step_overshoot_is_not_converged(models, N):
+    # Steps so large that the first one already reaches the surface
+    for model in models:
+        rho_s, mass, radius, converged = model.run_batch([1665.3], mn, N=N)
+        assert not converged[0]
+        assert not model.solve(mn, 1665.3, N=N).converged
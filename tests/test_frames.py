@@ -0,0 +1,89 @@
+import collections
+import os
+import sys
+import time
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pygame = pytest.importorskip("pygame")
+from frames import FrameProvider
+
+class SlowSource:
+
+    '''
+    Frames filled with their index, counts how often every frame is read
+    '''
+
+    def __init__(self, frames, delay=0.005):
+        self.frames = frames
+        self.delay = delay
+        self.reads = collections.Counter()
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, index):
+        self.reads[index] += 1
+        time.sleep(self.delay)
+        return np.full((8, 8, 3), index, dtype=np.uint8)
+
+# Playback order with jumps, like the energy button and the explosion start
+order = list(range(20)) + [5, 6, 7, 15, 0, 1] + list(range(20))
+
+@pytest.mark.parametrize("keep", [True, False])
+def test_frames_in_order(keep):
+    provider = FrameProvider(SlowSource(20), size=(4, 4), keep=keep)
+    try:
+        for index in order:
+            assert pygame.surfarray.array3d(provider[index])[0, 0, 0] == index
+    finally:
+        provider.close()
+
+def test_keep_decodes_every_frame_once():
+    source = SlowSource(20)
+    provider = FrameProvider(source, size=(4, 4), keep=True)
+    try:
+        for index in order:
+            provider[index]
+    finally:
+        provider.close()
+    assert set(source.reads) == set(range(20))
+    assert max(source.reads.values()) == 1
+    assert provider.scaled == 20
+
+class PulseSource(SlowSource):
+
+    '''
+    The second half plays the first half backwards, like a pulse frame file
+    '''
+
+    def reference(self, index):
+        return min(index, self.frames - 1 - index)
+
+def test_keep_shares_referenced_frames():
+    source = PulseSource(20)
+    provider = FrameProvider(source, prefetch=len(source), size=(4, 4), keep=True)
+    try:
+        provider.expect(0)
+        provider.wait()
+        assert provider[15] is provider[4]
+    finally:
+        provider.close()
+    assert set(source.reads) == set(range(10))
+    assert max(source.reads.values()) == 1
+
+def test_expect_prefetches_from_the_jump_target():
+    source = SlowSource(20)
+    provider = FrameProvider(source, size=(4, 4), keep=True)
+    try:
+        # Nothing is decoded before the first request
+        time.sleep(0.05)
+        assert not source.reads and provider.idle
+        provider.expect(7)
+        provider.wait()
+        assert set(source.reads) == {7, 8, 9, 10}
+        assert pygame.surfarray.array3d(provider[7])[0, 0, 0] == 7
+        assert source.reads[7] == 1
+    finally:
+        provider.close()
@@ -0,0 +1,46 @@
+import os
+import sys
+import threading
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.framestore import open_frames, save_frames
+
+def pulse(frames=12, size=24):
+    # Smooth frames that change a little from one to the next, played up and back down
+    x = np.linspace(-1, 1, size)
+    r2 = x[:, None]**2 + x[None, :]**2
+    up = [np.repeat((255 / (1 + r2 * (1 + k / 4)))[..., None], 3, axis=-1).astype(np.uint8) for k in range(frames // 2)]
+    return np.stack(up + up[::-1])
+
+def test_round_trip(tmp_path):
+    data = pulse()
+    path = str(tmp_path / "pulse.frames")
+    save_frames(path, data, {"name": "pulse"}, interval=4)
+    frames, params = open_frames(path)
+    assert params == {"name": "pulse"}
+    assert len(frames) == len(data)
+    kinds = [next(iter(entry)) for entry in frames.table]
+    assert "delta" in kinds and "ref" in kinds
+    # Jumps into the middle of delta runs, backwards and forwards
+    for index in [7, 3, 11, 0, 5, 10, 2, 9, -1]:
+        assert np.array_equal(frames[index], data[index])
+    assert frames.reference(11) == 0
+    assert frames.reference(5) == 5
+
+def test_threads_decode_the_same_frames(tmp_path):
+    data = pulse(frames=16)
+    path = str(tmp_path / "pulse.frames")
+    save_frames(path, data, {}, interval=8)
+    frames, params = open_frames(path)
+    errors = []
+    def read(order):
+        for index in order:
+            if not np.array_equal(frames[index], data[index]):
+                errors.append(index)
+    threads = [threading.Thread(target=read, args=(order,)) for order in (range(16), range(15, -1, -1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
@@ -0,0 +1,35 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model import SWEEP_COLUMNS, StarModel, write_table
+
+mn = 939.565
+
+# Trial steps past the surface make the pressure negative, the EOS warns and gives NaN
+pytestmark = pytest.mark.filterwarnings("ignore::RuntimeWarning")
+
+@pytest.mark.parametrize("flag", [0, 1])
+@pytest.mark.parametrize("h0", [0.5, 1.])
+@pytest.mark.parametrize("rho_s", [200., 726.271186440678, 1665.3, 5000.])
+def test_adaptive_large_first_step(rho_s, flag, h0):
+    # Python floats, a negative float ** (1/2.54) would be complex
+    solution = StarModel().solve(mn, float(rho_s), flag, "rk45", h0=h0)
+    reference = StarModel().solve(mn, np.float64(rho_s), flag, "rk45")
+    assert solution.converged
+    assert np.isfinite(solution.mass) and np.isfinite(solution.radius)
+    assert solution.mass == pytest.approx(reference.mass, rel=1e-5)
+    assert solution.radius == pytest.approx(reference.radius, rel=1e-5)
+
+def test_write_table_csv(tmp_path):
+    table = {key: np.array([1, 0], dtype=dtype) for key, dtype in SWEEP_COLUMNS.items()}
+    table["mass"] = np.array([1.4, 2.1])
+    path = tmp_path / "sweep.csv"
+    write_table(path, table)
+    header, first, second = path.read_text().splitlines()
+    assert header == ",".join(SWEEP_COLUMNS)
+    row = dict(zip(SWEEP_COLUMNS, first.split(",")))
+    assert row["flag"] == "1" and row["converged"] == "1"
+    assert float(row["mass"]) == 1.4
@@ -0,0 +1,52 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.preprocess_data import Preprocess
+
+# Star of draw.py on a small odd grid, the centered star sits on the middle pixel
+amp = 100
+beta = 4.5
+x = np.linspace(-20, 20, 101)
+X, Y = np.meshgrid(x, x)
+alphas = np.array([3., 6., 9.])
+
+# center, mirrored along x, mirrored along y
+centers = {
+    "centered": ((0., 0.), True, True),
+    "shifted": ((1.3, -2.7), False, False),
+    "shifted_y": ((0., 2.5), True, False),
+}
+
+@pytest.fixture(scope="module")
+def preprocess():
+    return Preprocess()
+
+@pytest.mark.parametrize("name", centers)
+def test_mirrors(preprocess, name):
+    center, mirror_x, mirror_y = centers[name]
+    profile = preprocess.radial_profile(X, Y, center)
+    assert (profile.mirror_x, profile.mirror_y) == (mirror_x, mirror_y)
+
+@pytest.mark.parametrize("scheme", ["normal", "no_energy"])
+@pytest.mark.parametrize("name", centers)
+def test_within_one_color_level(preprocess, name, scheme):
+    center = centers[name][0]
+    frames = np.tile(center, (len(alphas), 1))
+    colormap = preprocess.colormaps[scheme]
+    direct = preprocess.render_frames(X, Y, amp, frames, alphas, beta, colormap, label=None, radial=False)
+    radial = preprocess.render_frames(X, Y, amp, frames, alphas, beta, colormap, label=None, radial=True)
+    assert np.abs(direct.astype(np.int16) - radial).max() <= 1
+
+@pytest.mark.parametrize("name", centers)
+def test_error_bound(preprocess, name):
+    center = centers[name][0]
+    profile = preprocess.radial_profile(X, Y, center)
+    r = np.sqrt((X - center[0])**2 + (Y - center[1])**2)
+    for alpha in alphas:
+        exact = (1 + r**2 / alpha**2) ** (-beta)
+        exact = (exact - exact.min()) / (exact.max() - exact.min())
+        table = profile.profile(1, alpha, beta)[np.rint((r - profile.radii[0]) / profile.step).astype(int)]
+        assert np.abs(table - exact).max() <= profile.error_bound(alpha, beta) + 1e-12